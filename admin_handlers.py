@@ -1,18 +1,37 @@
 import logging
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import ContextTypes, ConversationHandler
-from database import db
+from router import callback
+from outbox import split_message, DELIVERY, MEDIA_GROUP_SIZE
+from processor import PerUserUpdateProcessor
+from rates import rate_cache
+from store import stores
+from templates import currency_label
+from analytics import record_sale, sales_report
+from export import export_orders as write_orders_export, parse_export_args
+from importer import ImportFileError, IMPORT_COLUMNS, read_rows, import_products
 from datetime import datetime
+import asyncio
+import io
+import os
 
 logger = logging.getLogger(__name__)
 
 class AdminHandlers:
-    def __init__(self, config):
-        self.config = config
+    def __init__(self, store):
+        self.store = store
+        self.config = store.config
+        self.db = store.db
+        self.content_cache = store.content_cache
+        self.catalog_cache = store.catalog_cache
+        self.outbox = store.outbox
+        self.templates = store.templates
+        self.edit_message = store.render_cache.edit_message
 
     def is_admin(self, user_id):
         return user_id == self.config.ADMIN_ID
 
+    @callback("admin_panel")
     async def show_admin_panel(self, update, context):
         if not self.is_admin(update.effective_user.id):
             if hasattr(update, 'callback_query'):
@@ -21,32 +40,24 @@ class AdminHandlers:
         
         text = "🛠️ Admin Panel:"
         
-        keyboard = [
-            [InlineKeyboardButton("📦 Product Management", callback_data="product_management")],
-            [InlineKeyboardButton("📝 Content Management", callback_data="content_management")],
-            [InlineKeyboardButton("💳 Payment Settings", callback_data="payment_settings")],
-            [InlineKeyboardButton("🎫 Discount Codes", callback_data="discount_codes")],
-            [InlineKeyboardButton("📊 Statistics", callback_data="statistics")],
-            [InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.templates.keyboard('admin_panel')
         
         if hasattr(update, 'callback_query'):
-            await update.callback_query.edit_message_text(text, reply_markup=reply_markup)
+            await self.edit_message(update.callback_query, text, reply_markup=reply_markup)
         else:
             await update.message.reply_text(text, reply_markup=reply_markup)
 
-    async def show_product_management(self, update, context):
+    @callback("product_management")
+    @callback("pm_", str, int)
+    async def show_product_management(self, update, context, direction=None, product_id=None):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, name, price, active FROM products ORDER BY name')
-        products = cursor.fetchall()
-        conn.close()
+        products, has_prev, has_next = await self.db.fetch_product_page(
+            'id, name, price, active', 'TRUE',
+            direction, product_id, self.config.PRODUCTS_PAGE_SIZE
+        )
         
         text = "📦 Product Management:"
         
@@ -59,13 +70,87 @@ class AdminHandlers:
                 callback_data=f"edit_product_{product_id}"
             )])
         
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("◀️ Previous", callback_data=f"pm_prev_{products[0][0]}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"pm_next_{products[-1][0]}"))
+        if navigation:
+            keyboard.append(navigation)
+        
         keyboard.append([InlineKeyboardButton("➕ Add New Product", callback_data="add_new_product")])
+        keyboard.append([InlineKeyboardButton("📥 Import Products", callback_data="import_products")])
         keyboard.append([InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")])
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
+
+    @callback("import_products")
+    async def show_import_help(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            await update.callback_query.answer("Access denied!", show_alert=True)
+            return
+        
+        text = f"""📥 Bulk Product Import
+
+Send a CSV or XLSX file as a document. The first row is the header:
+{', '.join(IMPORT_COLUMNS)}
+
+• name is required; existing products are matched by exact name and updated
+• price is required for new products
+• empty cells leave the current value unchanged
+• active accepts yes/no"""
+        
+        keyboard = [[InlineKeyboardButton("🔙 Back to Products", callback_data="product_management")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        query = update.callback_query
+        await self.edit_message(query, text, reply_markup=reply_markup)
+
+    async def receive_import_file(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            return
+        
+        document = update.message.document
+        filename = document.file_name or 'import.csv'
+        if not filename.lower().endswith(('.csv', '.xlsx', '.txt')):
+            await update.message.reply_text("❌ Please send a .csv or .xlsx file.")
+            return
+        
+        file = await document.get_file()
+        data = bytes(await file.download_as_bytearray())
+        
+        try:
+            header, rows = await asyncio.to_thread(read_rows, data, filename)
+        except ImportFileError as e:
+            await update.message.reply_text(f"❌ Import failed: {e}")
+            return
+        
+        inserted, updated, errors = await self.db.run(import_products, header, rows)
+        if inserted or updated:
+            self.catalog_cache.invalidate()
+        
+        text = f"""📥 Import finished
+
+➕ Added: {inserted}
+✏️ Updated: {updated}
+❌ Rejected: {len(errors)}"""
+        
+        if errors:
+            text += "\n\n" + "\n".join(f"Row {row}: {message}" for row, message in errors[:20])
+            if len(errors) > 20:
+                text += f"\n... and {len(errors) - 20} more, see the attached report"
+        
+        await update.message.reply_text(text)
+        
+        if len(errors) > 20:
+            report = "\n".join(f"Row {row}: {message}" for row, message in errors)
+            await update.message.reply_document(
+                document=io.BytesIO(report.encode('utf-8')),
+                filename="import_errors.txt"
+            )
 
     async def start_add_product(self, update, context):
         if not self.is_admin(update.effective_user.id):
@@ -73,7 +158,7 @@ class AdminHandlers:
             return
         
         context.user_data['new_product'] = {}
-        await update.callback_query.edit_message_text("Enter product name:")
+        await self.edit_message(update.callback_query, "Enter product name:")
         return self.config.PRODUCT_NAME
 
     async def receive_product_name(self, update, context):
@@ -152,10 +237,7 @@ class AdminHandlers:
                 return self.config.PRODUCT_COORDINATES
         
         product_data = context.user_data['new_product']
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        await self.db.execute('''
             INSERT INTO products (name, price, description, quantity, image1, image2, coordinates, active)
             VALUES (?, ?, ?, ?, ?, ?, ?, TRUE)
         ''', (
@@ -167,9 +249,7 @@ class AdminHandlers:
             product_data.get('image2'),
             product_data.get('coordinates')
         ))
-        
-        conn.commit()
-        conn.close()
+        self.catalog_cache.invalidate()
         
         coord_message = f"📍 Coordinates: {product_data.get('coordinates') or 'Not set'}\n\n" if product_data.get('coordinates') else ""
         image_count = 1 + (1 if product_data.get('image2') else 0)
@@ -188,19 +268,17 @@ Product is now available to clients."""
         await self.show_product_management(update, context)
         return ConversationHandler.END
 
+    @callback("edit_product_", int)
+    @callback("cancel_delete_", int)
     async def show_product_edit(self, update, context, product_id: int):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT name, price, description, quantity, coordinates, active FROM products WHERE id = ?', (product_id,))
-        product = cursor.fetchone()
-        conn.close()
+        product = await self.db.fetchone('SELECT name, price, description, quantity, coordinates, active FROM products WHERE id = ?', (product_id,))
         
         if not product:
-            await update.callback_query.edit_message_text("Product not found!")
+            await self.edit_message(update.callback_query, "Product not found!")
             return
         
         name, price, description, quantity, coordinates, active = product
@@ -229,21 +307,18 @@ Product is now available to clients."""
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("delete_product_", int)
     async def confirm_delete_product(self, update, context, product_id: int):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT name, price FROM products WHERE id = ?', (product_id,))
-        product = cursor.fetchone()
-        conn.close()
+        product = await self.db.fetchone('SELECT name, price FROM products WHERE id = ?', (product_id,))
         
         if not product:
-            await update.callback_query.edit_message_text("Product not found!")
+            await self.edit_message(update.callback_query, "Product not found!")
             return
         
         name, price = product
@@ -267,22 +342,21 @@ Are you sure you want to delete this product?
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
+    @callback("confirm_delete_", int)
     async def delete_product(self, update, context, product_id: int):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM products WHERE id = ?', (product_id,))
-        conn.commit()
-        conn.close()
+        await self.db.execute('DELETE FROM products WHERE id = ?', (product_id,))
+        self.catalog_cache.invalidate()
         
         await update.callback_query.answer("Product deleted!")
         await self.show_product_management(update, context)
 
+    @callback("content_management")
     async def show_content_management(self, update, context):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
@@ -304,47 +378,61 @@ Are you sure you want to delete this product?
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
-    async def show_payment_settings(self, update, context):
+    async def start_edit_content(self, update, context):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
-            return
+            return ConversationHandler.END
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT currency_code, address, blockchain FROM payment_settings')
-        payment_methods = cursor.fetchall()
-        conn.close()
+        key = update.callback_query.data[len("edit_content_"):]
+        context.user_data['content_key'] = key
+        current = await self.content_cache.get(key, default="")
         
-        text = "💳 Payment Settings:\n\n"
+        text = f"""📝 Editing: {key}
+
+Current text:
+{current or '(empty)'}
+
+Send the new text:"""
         
-        keyboard = []
-        for method in payment_methods:
-            currency_code, address, blockchain = method
-            currency_name = {
-                'btc': '₿ Bitcoin',
-                'eth': 'Ξ Ethereum', 
-                'sol': '◎ Solana',
-                'ltc': '💎 Litecoin',
-                'usdt': '💵 USDT'
-            }.get(currency_code, currency_code.upper())
-            
-            text += f"{currency_name}:\n`{address}`\n\n"
-            
-            keyboard.append([
-                InlineKeyboardButton(f"✏️ Edit {currency_name}", callback_data=f"edit_payment_{currency_code}"),
-                InlineKeyboardButton(f"🗑️ Remove {currency_name}", callback_data=f"remove_payment_{currency_code}")
-            ])
-        
-        keyboard.append([InlineKeyboardButton("➕ Add New Crypto", callback_data="add_new_crypto")])
-        keyboard.append([InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")])
+        await self.edit_message(update.callback_query, text)
+        return self.config.CONTENT_EDIT
+
+    async def receive_content_edit(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            return ConversationHandler.END
+        
+        key = context.user_data.pop('content_key', None)
+        if not key:
+            return ConversationHandler.END
         
+        await self.content_cache.set(key, update.message.text)
+        
+        keyboard = [[InlineKeyboardButton("🔙 Back to Content Management", callback_data="content_management")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
+        await update.message.reply_text(f"✅ {key} updated!", reply_markup=reply_markup)
+        return ConversationHandler.END
+
+    @callback("payment_settings")
+    async def show_payment_settings(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            await update.callback_query.answer("Access denied!", show_alert=True)
+            return
+        
+        payment_methods = await self.db.fetchall('SELECT currency_code, address, blockchain FROM payment_settings')
+        
+        text = self.templates.render(
+            'payment_settings',
+            methods=self.templates.render_rows('payment_settings_item', [(currency_label(code), address) for code, address, blockchain in payment_methods])
+        )
+        reply_markup = self.templates.keyboard('payment_settings', tuple(method[0] for method in payment_methods))
+        
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
+    @callback("discount_codes")
     async def show_discount_management(self, update, context):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
@@ -362,63 +450,218 @@ Are you sure you want to delete this product?
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("statistics")
     async def show_statistics(self, update, context):
         if not self.is_admin(update.effective_user.id):
             await update.callback_query.answer("Access denied!", show_alert=True)
             return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM products')
-        total_products = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM products WHERE active = TRUE')
-        active_products = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM orders')
-        total_orders = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM orders WHERE status = "completed"')
-        completed_orders = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM orders WHERE status = "pending"')
-        pending_orders = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM cart')
-        products_in_carts = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM discount_codes')
-        total_codes = cursor.fetchone()[0]
-        cursor.execute('SELECT COUNT(*) FROM discount_codes WHERE active = TRUE')
-        active_codes = cursor.fetchone()[0]
-        
-        conn.close()
+        counters = await self.db.read_counters()
+        cache_stats = self.content_cache.stats()
+        render_stats = self.store.render_cache.stats()
+        outbox_stats = self.outbox.stats()
+        session_stats = self.store.session_sweeper.stats()
+        purge_stats = self.store.cart_purger.stats()
+        rate_stats = rate_cache.stats()
+        rate_age = f"{rate_stats['age']:.0f}s ago" if rate_stats['age'] is not None else "never"
+        peak_memory = f"{session_stats['peak_rss_kb'] / 1024:.1f} MB" if session_stats['peak_rss_kb'] is not None else "n/a"
+        
+        processor = getattr(context.application, 'update_processor', None)
+        processor_text = ""
+        if isinstance(processor, PerUserUpdateProcessor):
+            processor_stats = processor.stats()
+            processor_text = f"""
+
+⚙️ UPDATES:
+• Workers: {processor_stats['running']}/{processor_stats['workers']} busy
+• Queued: {processor_stats['queued']}
+• Users in flight: {processor_stats['active_users']}
+• Processed: {processor_stats['processed']}
+• Deepest user queue: {processor_stats['max_user_depth']}
+• Longest wait: {processor_stats['max_wait']:.2f}s"""
+            if self.store.shard is not None:
+                index, count = self.store.shard
+                processor_text += f"\n• Worker process: {index + 1} of {count} (figures above are for this worker)"
+        
+        tenants_text = ""
+        if len(stores) > 1:
+            # Each tenant has its own admin: show this store and the totals
+            # of what the stores share, never the other tenants' figures
+            metrics = self.store.metrics()
+            db_stats = self.db.stats()
+            db_connections = sum(store.db.stats()['connections'] for store in stores)
+            shared = "shared by all stores" if db_stats['shared_executor'] else "per store"
+            tenants_text = f"""
+
+🏬 SHARED PROCESS ({len(stores)} stores):
+▶️ {metrics['name']}: {metrics['processed']} updates, {metrics['sent']} sent, {metrics['users']} users, {metrics['db_connections']} DB conns
+• DB connections, all stores: {db_connections}
+• DB threads: {db_stats['threads'] or '?'} ({shared})
+• Exchange rates: one cache for all stores"""
         
         text = f"""📊 STORE STATISTICS
 
 🛍️ PRODUCTS:
-• All products: {total_products}
-• Active products: {active_products}
+• All products: {counters['total_products']}
+• Active products: {counters['active_products']}
 
 📦 ORDERS:
-• All orders: {total_orders}
-• Completed: {completed_orders}
-• Pending: {pending_orders}
+• All orders: {counters['total_orders']}
+• Completed: {counters['completed_orders']}
+• Pending: {counters['pending_orders']}
 
 🛒 CARTS:
-• Products in carts: {products_in_carts}
+• Products in carts: {counters['cart_items']}
+• Expired rows purged: {purge_stats['reclaimed']} (last run: {purge_stats['last_reclaimed']})
 
 🎫 DISCOUNT CODES:
-• All codes: {total_codes}
-• Active: {active_codes}"""
+• All codes: {counters['total_codes']}
+• Active: {counters['active_codes']}
+
+⚡ CONTENT CACHE:
+• Hits: {cache_stats['hits']}
+• Misses: {cache_stats['misses']}
+• Hit rate: {cache_stats['hit_rate']:.1%}
+• Skipped no-op edits: {render_stats['skipped']} of {render_stats['skipped'] + render_stats['edits']} ({render_stats['skip_rate']:.1%})
+
+📤 OUTBOX:
+• Pending: {outbox_stats['pending']}
+• Sent: {outbox_stats['sent']}
+• Retries: {outbox_stats['retries']}
+• Failed: {outbox_stats['failed']}
+
+🧠 SESSIONS:
+• Users with data: {session_stats['users']}
+• Open checkouts: {session_stats['open_checkouts']}
+• user_data size: ~{session_stats['user_data_bytes'] / 1024:.1f} KB
+• Expired checkouts evicted: {session_stats['evicted']}
+• Peak memory: {peak_memory}
+
+💱 EXCHANGE RATES:
+• Provider: {rate_stats['provider']} ({', '.join(rate_stats['currencies']) or 'no quotes'})
+• Updated: {rate_age}
+• Refresh errors: {rate_stats['errors']}{processor_text}{tenants_text}"""
         
-        keyboard = [[InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")]]
+        keyboard = [
+            [InlineKeyboardButton("🔁 Recheck Counters", callback_data="rebuild_counters")],
+            [InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
+
+    @callback("rebuild_counters")
+    async def rebuild_counters(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            if update.callback_query:
+                await update.callback_query.answer("Access denied!", show_alert=True)
+            return
+        
+        drift = await self.db.rebuild_counters()
+        
+        if drift:
+            text = "🔁 Counters rebuilt, corrected:\n\n" + "\n".join(
+                f"• {column}: {stored} → {actual}" for column, (stored, actual) in drift.items()
+            )
+        else:
+            text = "✅ Counters are consistent."
+        
+        if update.callback_query:
+            keyboard = [[InlineKeyboardButton("📊 Statistics", callback_data="statistics")]]
+            await self.edit_message(update.callback_query, text, reply_markup=InlineKeyboardMarkup(keyboard))
+        else:
+            await update.message.reply_text(text)
+
+    @callback("sales_report")
+    @callback("sales_report_", int)
+    async def show_sales_report(self, update, context, days: int = 30):
+        if not self.is_admin(update.effective_user.id):
+            await update.callback_query.answer("Access denied!", show_alert=True)
+            return
+        
+        days = max(1, min(days, 3660))
+        report = await sales_report(self.db, days)
+        
+        total_orders = sum(row[1] for row in report['by_currency'])
+        total_revenue = sum(row[3] for row in report['by_currency'])
+        
+        text = f"📈 SALES REPORT (last {days} days)\n\n"
+        text += f"💰 Revenue: {total_revenue:.2f}€\n"
+        text += f"📦 Completed orders: {total_orders}\n"
+        
+        if report['by_currency']:
+            text += "\n💳 BY CURRENCY:\n"
+            for currency, orders, units, revenue in report['by_currency']:
+                text += f"• {(currency or '-').upper()}: {revenue:.2f}€ ({orders} orders)\n"
+        
+        if report['by_day']:
+            text += "\n📅 BY DAY:\n"
+            for day, orders, units, revenue in report['by_day'][:14]:
+                text += f"• {day}: {revenue:.2f}€ ({orders} orders, {units} units)\n"
+        
+        if report['by_product']:
+            text += "\n🛍️ TOP PRODUCTS:\n"
+            for product_name, units, revenue in report['by_product']:
+                text += f"• {product_name}: {revenue:.2f}€ ({units} units)\n"
+        
+        if report['by_discount']:
+            text += "\n🎫 TOP DISCOUNT CODES:\n"
+            for code, orders, revenue in report['by_discount']:
+                text += f"• {code}: {revenue:.2f}€ ({orders} orders)\n"
+        
+        keyboard = [
+            [
+                InlineKeyboardButton("7 days", callback_data="sales_report_7"),
+                InlineKeyboardButton("30 days", callback_data="sales_report_30"),
+                InlineKeyboardButton("365 days", callback_data="sales_report_365")
+            ],
+            [InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        query = update.callback_query
+        await self.edit_message(query, text, reply_markup=reply_markup)
+
+    @callback("export_orders")
+    async def export_orders(self, update, context):
+        if not self.is_admin(update.effective_user.id):
+            if update.callback_query:
+                await update.callback_query.answer("Access denied!", show_alert=True)
+            return
+        
+        chat_id = update.effective_chat.id
+        try:
+            fmt, status, since, until = parse_export_args(context.args or [])
+        except ValueError as e:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=f"❌ {e}\n\nUsage: /export [csv|ndjson] [all|pending|completed|rejected] [from YYYY-MM-DD] [to YYYY-MM-DD]"
+            )
+            return
+        
+        await context.bot.send_message(chat_id=chat_id, text="⏳ Preparing export...")
+        path, count = await write_orders_export(self.db, fmt, status, since, until)
+        try:
+            if os.path.getsize(path) > 50 * 1024 * 1024:
+                await context.bot.send_message(chat_id=chat_id, text="❌ Export is larger than 50 MB, narrow it down with a status or date range.")
+                return
+        
+            filename = f"orders_{status or 'all'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}.gz"
+            with open(path, 'rb') as f:
+                await context.bot.send_document(
+                    chat_id=chat_id,
+                    document=f,
+                    filename=filename,
+                    caption=f"📤 {count} order rows"
+                )
+        finally:
+            os.remove(path)
 
     # Payment confirmation handlers
+    @callback("admin_confirm_", str)
     async def ask_admin_confirmation(self, update, context, order_id: str):
         text = f"""🔍 **CONFIRMATION**
 
@@ -436,50 +679,79 @@ Are you sure you want to approve this payment?
         reply_markup = InlineKeyboardMarkup(keyboard)
 
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
+    @callback("admin_confirm_yes_", str)
     async def confirm_payment(self, update, context, order_id: str):
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        def _complete(conn):
+            cursor = conn.cursor()
 
-        cursor.execute('SELECT user_id, product_id, product_name, quantity FROM orders WHERE order_id = ?', (order_id,))
-        orders = cursor.fetchall()
+            cursor.execute('SELECT user_id FROM orders WHERE order_id = ?', (order_id,))
+            order = cursor.fetchone()
+            if not order:
+                return None
+            user_id = order[0]
 
-        cursor.execute('UPDATE orders SET status = ? WHERE order_id = ?', ('completed', order_id))
-        conn.commit()
+            cursor.execute('SELECT product_id, product_name, quantity FROM order_items WHERE order_id = ? ORDER BY id', (order_id,))
+            items = cursor.fetchall()
 
-        for order in orders:
-            user_id, product_id, product_name, quantity = order
+            cursor.execute("UPDATE orders SET status = 'completed' WHERE order_id = ? AND status != 'completed'", (order_id,))
+            if cursor.rowcount:
+                record_sale(cursor, order_id)
+            conn.commit()
 
-            cursor.execute('SELECT image1, image2, coordinates FROM products WHERE id = ?', (product_id,))
-            product = cursor.fetchone()
+            # One lookup for every product in the order instead of one per item
+            product_ids = list({product_id for product_id, _, _ in items})
+            placeholders = ', '.join('?' * len(product_ids))
+            cursor.execute(f'SELECT id, image1, image2, coordinates FROM products WHERE id IN ({placeholders})', product_ids)
+            products = {row[0]: row[1:] for row in cursor.fetchall()}
 
-            if product:
-                image1, image2, coordinates = product
+            deliveries = [
+                (product_name, quantity) + products[product_id]
+                for product_id, product_name, quantity in items
+                if product_id in products
+            ]
+            return user_id, deliveries
 
-                text = f"✅ Your payment has been confirmed!\n\n🛍️ Product: {product_name}\n📦 Quantity: {quantity}"
+        # All DB work is finished and the connection released before any sends
+        user_id, deliveries = await self.db.run(_complete) or (None, [])
 
+        if deliveries:
+            blocks = []
+            photos = []
+            for product_name, quantity, image1, image2, coordinates in deliveries:
+                block = f"🛍️ Product: {product_name}\n📦 Quantity: {quantity}"
                 if coordinates:
-                    text += f"\n📍 Location: {coordinates}"
-
-                await context.bot.send_message(chat_id=user_id, text=text)
+                    block += f"\n📍 Location: {coordinates}"
+                blocks.append(block)
 
                 if image1:
-                    await context.bot.send_photo(chat_id=user_id, photo=image1, caption="Product image 1")
+                    photos.append(InputMediaPhoto(image1, caption=f"{product_name} - image 1"))
                 if image2:
-                    await context.bot.send_photo(chat_id=user_id, photo=image2, caption="Product image 2")
+                    photos.append(InputMediaPhoto(image2, caption=f"{product_name} - image 2"))
+
+            for text in split_message("✅ Your payment has been confirmed!", blocks):
+                self.outbox.send_message(user_id, text, priority=DELIVERY)
 
-        conn.close()
+            # Albums hold 2-10 photos; a lone photo is sent on its own
+            for i in range(0, len(photos), MEDIA_GROUP_SIZE):
+                album = photos[i:i + MEDIA_GROUP_SIZE]
+                if len(album) == 1:
+                    self.outbox.send_photo(user_id, album[0].media, priority=DELIVERY, caption=album[0].caption)
+                else:
+                    self.outbox.send_media_group(user_id, album, priority=DELIVERY)
 
         query = update.callback_query
-        await query.edit_message_text(f"✅ Payment for order {order_id} confirmed and client notified!")
+        await self.edit_message(query, f"✅ Payment for order {order_id} confirmed and client notified!")
 
+    @callback("admin_confirm_no_", str)
     async def cancel_confirmation(self, update, context, order_id: str):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id, user_name, product_name, total_price, payment_currency, payment_source_address, discount_code FROM orders WHERE order_id = ? LIMIT 1', (order_id,))
-        order = cursor.fetchone()
-        conn.close()
+        order = await self.db.fetchone('''
+            SELECT user_id, user_name,
+                   (SELECT product_name FROM order_items i WHERE i.order_id = o.order_id ORDER BY i.id LIMIT 1),
+                   total_price, payment_currency, payment_source_address, discount_code
+            FROM orders o WHERE order_id = ?
+        ''', (order_id,))
 
         if order:
             user_id, user_name, product_name, total_price, payment_currency, payment_source_address, discount_code = order
@@ -508,24 +780,28 @@ Is payment visible in your wallet?"""
             reply_markup = InlineKeyboardMarkup(keyboard)
 
             query = update.callback_query
-            await query.edit_message_text(text, reply_markup=reply_markup)
+            await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("admin_reject_", str)
     async def reject_payment(self, update, context, order_id: str):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE orders SET status = ? WHERE order_id = ?', ('rejected', order_id))
-        conn.commit()
-
-        cursor.execute('SELECT user_id FROM orders WHERE order_id = ? LIMIT 1', (order_id,))
-        order = cursor.fetchone()
+        def _reject(conn):
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id, status FROM orders WHERE order_id = ?', (order_id,))
+            order = cursor.fetchone()
+            if not order:
+                return None
+
+            # Rejecting an already completed order takes it back out of the rollups
+            if order[1] == 'completed':
+                record_sale(cursor, order_id, -1)
+            cursor.execute('UPDATE orders SET status = ? WHERE order_id = ?', ('rejected', order_id))
+            conn.commit()
+            return order
+
+        order = await self.db.run(_reject)
         if order:
             user_id = order[0]
-            await context.bot.send_message(
-                chat_id=user_id, 
-                text=f"❌ Your payment for order {order_id} has been rejected. Please contact admin."
-            )
-
-        conn.close()
+            self.outbox.send_message(user_id, f"❌ Your payment for order {order_id} has been rejected. Please contact admin.")
 
         query = update.callback_query
-        await query.edit_message_text(f"❌ Payment for order {order_id} rejected!")
+        await self.edit_message(query, f"❌ Payment for order {order_id} rejected!")
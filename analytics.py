@@ -0,0 +1,98 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+def record_sale(cursor, order_id: str, sign: int = 1):
+    # Adds (sign=1) or removes (sign=-1) one order's contribution to the
+    # sales rollups. Must run in the same transaction as the status change
+    # that causes it, so the rollups can never disagree with orders.
+    # Product revenue is list price x quantity; day/currency and discount
+    # revenue use the order total, i.e. after discounts.
+    cursor.execute('''
+        INSERT INTO sales_daily (day, currency, orders, units, revenue)
+        SELECT date(o.created_at), COALESCE(o.payment_currency, ''), ?,
+               ? * (SELECT COALESCE(SUM(quantity), 0) FROM order_items i WHERE i.order_id = o.order_id),
+               ? * o.total_price
+        FROM orders o
+        WHERE o.order_id = ?
+        ON CONFLICT (day, currency) DO UPDATE SET
+            orders = orders + excluded.orders,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue
+    ''', (sign, sign, sign, order_id))
+    
+    cursor.execute('''
+        INSERT INTO sales_by_product (day, product_id, product_name, units, revenue)
+        SELECT date(o.created_at), i.product_id, i.product_name, ? * i.quantity, ? * COALESCE(i.price, 0) * i.quantity
+        FROM order_items i
+        JOIN orders o ON o.order_id = i.order_id
+        WHERE i.order_id = ? AND i.product_id IS NOT NULL
+        ON CONFLICT (day, product_id) DO UPDATE SET
+            product_name = excluded.product_name,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue
+    ''', (sign, sign, order_id))
+    
+    cursor.execute('''
+        INSERT INTO sales_by_discount (day, code, orders, revenue)
+        SELECT date(created_at), discount_code, ?, ? * total_price
+        FROM orders
+        WHERE order_id = ? AND discount_code IS NOT NULL
+        ON CONFLICT (day, code) DO UPDATE SET
+            orders = orders + excluded.orders,
+            revenue = revenue + excluded.revenue
+    ''', (sign, sign, order_id))
+
+async def sales_report(db, days: int = 30, top: int = 5):
+    # Everything is read from the rollup tables; the cost depends on the
+    # number of days, currencies, products and codes in the window, never
+    # on order count.
+    def _report(conn):
+        cursor = conn.cursor()
+        # created_at, and so every rollup day, is UTC
+        cursor.execute("SELECT date('now', ?)", (f'-{days - 1} days',))
+        since = cursor.fetchone()[0]
+        
+        cursor.execute('''
+            SELECT day, SUM(orders), SUM(units), SUM(revenue)
+            FROM sales_daily WHERE day >= ?
+            GROUP BY day HAVING SUM(orders) > 0
+            ORDER BY day DESC
+        ''', (since,))
+        by_day = cursor.fetchall()
+        
+        cursor.execute('''
+            SELECT currency, SUM(orders), SUM(units), SUM(revenue)
+            FROM sales_daily WHERE day >= ?
+            GROUP BY currency HAVING SUM(orders) > 0
+            ORDER BY SUM(revenue) DESC
+        ''', (since,))
+        by_currency = cursor.fetchall()
+        
+        cursor.execute('''
+            SELECT product_name, units, revenue FROM (
+                -- product_name comes from the latest day the product sold
+                SELECT MAX(day), product_name, SUM(units) AS units, SUM(revenue) AS revenue
+                FROM sales_by_product WHERE day >= ?
+                GROUP BY product_id
+            )
+            WHERE units > 0 ORDER BY revenue DESC LIMIT ?
+        ''', (since, top))
+        by_product = cursor.fetchall()
+        
+        cursor.execute('''
+            SELECT code, SUM(orders), SUM(revenue) FROM sales_by_discount
+            WHERE day >= ?
+            GROUP BY code HAVING SUM(orders) > 0
+            ORDER BY SUM(revenue) DESC LIMIT ?
+        ''', (since, top))
+        by_discount = cursor.fetchall()
+        
+        return {
+            'by_day': by_day,
+            'by_currency': by_currency,
+            'by_product': by_product,
+            'by_discount': by_discount,
+        }
+    
+    return await db.run(_report)
@@ -0,0 +1,97 @@
+# p99 handler latency under concurrent load: sqlite on the event loop vs db.run().
+#
+#   python benchmarks/bench_db_latency.py
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+
+from database import Database
+
+READERS = 400
+WRITERS = 5
+PRODUCTS = 200
+WRITE_ROWS = 20000
+NETWORK_DELAY = 0.005
+
+
+def seed(db):
+    with db.connection() as conn:
+        conn.executemany(
+            'INSERT INTO products (name, price, description, quantity) VALUES (?, ?, ?, ?)',
+            [(f"Product {i:05d}", 10 + i % 50, "bench", 1 + i % 7) for i in range(PRODUCTS)]
+        )
+        conn.commit()
+
+
+def browse(conn):
+    return conn.execute('''
+        SELECT id, name, price, quantity FROM products
+        WHERE active = TRUE AND quantity > 0
+        ORDER BY name
+    ''').fetchall()
+
+
+def checkout(conn):
+    # A single large statement stands in for a slow write transaction.
+    conn.execute('''
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+        INSERT INTO cart (user_id, product_id, quantity)
+        SELECT i, i % ? + 1, 1 FROM n WHERE true
+        ON CONFLICT DO UPDATE SET quantity = quantity + 1
+    ''', (WRITE_ROWS, PRODUCTS))
+    conn.commit()
+
+
+async def blocking(db, func):
+    with db.connection() as conn:
+        return func(conn)
+
+
+async def non_blocking(db, func):
+    return await db.run(func)
+
+
+async def run_load(db, call):
+    latencies = []
+
+    async def reader(delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        await call(db, browse)
+        await asyncio.sleep(NETWORK_DELAY)
+        latencies.append(time.perf_counter() - start - NETWORK_DELAY)
+
+    async def writer(delay):
+        await asyncio.sleep(delay)
+        await call(db, checkout)
+
+    tasks = [reader(i * 0.002) for i in range(READERS)]
+    tasks += [writer(i * 0.15) for i in range(WRITERS)]
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{name:<14} p50={p50:7.2f}ms  p99={p99:7.2f}ms  max={latencies[-1] * 1000:7.2f}ms")
+
+
+def main():
+    db = Database(os.path.join(os.getcwd(), "bench.db"))
+    seed(db)
+    report("on event loop", asyncio.run(run_load(db, blocking)))
+    report("db.run", asyncio.run(run_load(db, non_blocking)))
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Per-update callback dispatch cost: CallbackRouter vs the old if/elif chain.
+#
+#   python benchmarks/bench_router.py
+import os
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault('BOT_TOKEN', '0:bench')
+os.environ.setdefault('ADMIN_ID', '1')
+
+from config import Config
+from client_handlers import ClientHandlers
+from admin_handlers import AdminHandlers
+from router import CallbackRouter
+from store import Store
+
+SAMPLES = [
+    "browse_products", "view_cart", "main_menu", "product_42", "add_to_cart_42",
+    "checkout_all", "payment_btc", "products_next_42", "product_management",
+    "statistics", "edit_product_42", "admin_confirm_yes_AB12CD34", "admin_reject_AB12CD34",
+]
+
+# The button_handler chain as it was before the router, in branch order:
+# (kind, pattern) with kind "eq" for == and "sw" for startswith.
+LEGACY_CHAIN = [
+    ("eq", "browse_products"), ("eq", "view_cart"), ("eq", "about"), ("eq", "contact"),
+    ("eq", "website"), ("eq", "rules"), ("eq", "faq"), ("eq", "main_menu"),
+    ("sw", "products_next_"), ("sw", "products_prev_"), ("sw", "product_"),
+    ("sw", "add_to_cart_"), ("eq", "back_to_products"), ("eq", "continue_shopping"),
+    ("eq", "clear_cart"), ("eq", "checkout_all"), ("sw", "buy_now_"), ("sw", "search_page_"),
+    ("eq", "no_discount"), ("eq", "continue_to_payment"), ("sw", "payment_"),
+    ("eq", "payment_made"), ("eq", "back_to_payment_methods"), ("eq", "admin_panel"),
+    ("eq", "product_management"), ("sw", "pm_next_"), ("sw", "pm_prev_"),
+    ("eq", "content_management"), ("eq", "payment_settings"), ("eq", "discount_codes"),
+    ("eq", "statistics"), ("eq", "add_new_product"), ("sw", "edit_product_"),
+    ("sw", "delete_product_"), ("sw", "confirm_delete_"), ("sw", "cancel_delete_"),
+    ("sw", "admin_confirm_"), ("sw", "admin_confirm_yes_"), ("sw", "admin_confirm_no_"),
+    ("sw", "admin_reject_"),
+]
+
+
+def legacy_resolve(data):
+    for index, (kind, pattern) in enumerate(LEGACY_CHAIN):
+        if data == pattern if kind == "eq" else data.startswith(pattern):
+            if kind == "sw":
+                data.split("_")
+            return index
+    return None
+
+
+def main():
+    store = Store(Config())
+    router = CallbackRouter()
+    router.register(ClientHandlers(store))
+    router.register(AdminHandlers(store))
+
+    rounds = 20000
+    print(f"{'callback data':<28} {'if/elif':>10} {'router':>10}")
+    for data in SAMPLES:
+        legacy = timeit.timeit(lambda: legacy_resolve(data), number=rounds) / rounds * 1e9
+        routed = timeit.timeit(lambda: router.resolve(data), number=rounds) / rounds * 1e9
+        print(f"{data:<28} {legacy:>8.0f}ns {routed:>8.0f}ns")
+
+
+if __name__ == '__main__':
+    main()
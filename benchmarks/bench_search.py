@@ -0,0 +1,92 @@
+# FTS5 product search latency on a large catalog.
+#
+#   python benchmarks/bench_search.py [products]
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+
+from database import Database, fts_match_query
+
+WORDS = (
+    "red green blue black white silver gold steel wooden leather cotton wool "
+    "shirt jacket boots sneakers hat scarf gloves watch ring bracelet necklace "
+    "lamp chair table desk shelf mirror carpet pillow blanket candle vase mug "
+    "phone charger cable speaker headphones keyboard mouse monitor camera lens"
+).split()
+
+QUERIES = ["jacket", "leath", "silver ring", "wooden desk lamp", "head", "xyzzy", "gold watch", "kavo"]
+ROUNDS = 200
+# Also time the page reached by following Next this many times
+DEEP_PAGE = 50
+
+
+def vocabulary(rng):
+    # Common product words plus a long tail of brand/model-like words,
+    # drawn with Zipf-like weights as real catalog text is.
+    syllables = ["ka", "vo", "ri", "tel", "mon", "sa", "lu", "dex", "pra", "zen", "qui", "nor"]
+    tail = sorted({"".join(rng.choices(syllables, k=rng.randint(2, 3))) for _ in range(6000)})
+    words = WORDS + tail
+    weights = [1 / (rank + 10) for rank in range(len(words))]
+    return words, weights
+
+
+def seed(db, count):
+    rng = random.Random(42)
+    words, weights = vocabulary(rng)
+    rows = []
+    for i in range(count):
+        name = " ".join([rng.choice(WORDS)] + rng.choices(words, weights, k=2)).title()
+        description = " ".join(rng.choices(words, weights, k=12))
+        rows.append((f"{name} {i}", 10 + i % 90, description, 1 + i % 5))
+    with db.connection() as conn:
+        conn.executemany(
+            'INSERT INTO products (name, price, description, quantity) VALUES (?, ?, ?, ?)', rows
+        )
+        conn.commit()
+
+
+async def timed(db, text, after):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await db.search_products(text, after, 10)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return statistics.median(timings) * 1000, timings[int(len(timings) * 0.99) - 1] * 1000
+
+
+async def run(db):
+    for text in QUERIES:
+        after = None
+        for _ in range(DEEP_PAGE):
+            _, key = await db.search_products(text, after, 10)
+            if key is None:
+                break
+            after = key
+        matches = await db.fetchone('SELECT COUNT(*) FROM products_fts WHERE products_fts MATCH ?', (fts_match_query(text),))
+        p50, p99 = await timed(db, text, None)
+        deep_p50, deep_p99 = await timed(db, text, after)
+        print(f"{text!r:<20} matches={matches[0]:>6}  p50={p50:6.2f}ms  p99={p99:6.2f}ms"
+              f"  deep p50={deep_p50:6.2f}ms  p99={deep_p99:6.2f}ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    db = Database(os.path.join(os.getcwd(), "bench.db"))
+    start = time.perf_counter()
+    seed(db, count)
+    print(f"seeded {count} products in {time.perf_counter() - start:.1f}s")
+    asyncio.run(run(db))
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
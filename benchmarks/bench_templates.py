@@ -0,0 +1,114 @@
+# Per-screen render cost: inline f-strings, += loops and per-call keyboard
+# construction vs the precompiled template registry with memoized keyboards.
+#
+#   python benchmarks/bench_templates.py
+import os
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault('BOT_TOKEN', '0:bench')
+os.environ.setdefault('ADMIN_ID', '1')
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from templates import TemplateRegistry, TEMPLATES, KEYBOARDS, currency_label
+
+CURRENCIES = ('btc', 'eth', 'sol', 'ltc', 'usdt')
+ADDRESSES = [(code, f"{code}-address-0123456789abcdef", code.upper()) for code in CURRENCIES]
+USD_RATE = 1.16
+
+templates = TemplateRegistry(TEMPLATES, KEYBOARDS, lambda: 0)
+
+
+def cart_rows(count):
+    return [(i, 1 + i % 3, f"Product {i}", 9.5 + i) for i in range(count)]
+
+
+# The handlers as they were before the registry
+def legacy_main_menu():
+    keyboard = [
+        [InlineKeyboardButton("🛍️ Browse Products", callback_data="browse_products"), InlineKeyboardButton("🛒 My Cart", callback_data="view_cart")],
+        [InlineKeyboardButton("ℹ️ About Us", callback_data="about"), InlineKeyboardButton("📞 Contact", callback_data="contact")],
+        [InlineKeyboardButton("🌐 Website", callback_data="website"), InlineKeyboardButton("📝 Rules", callback_data="rules")],
+        [InlineKeyboardButton("🔍 FAQ", callback_data="faq"), InlineKeyboardButton("🔎 Search", callback_data="search_products")],
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def legacy_cart(cart_items):
+    text = "🛒 Your Cart:\n\n"
+    total = 0
+    for product_id, quantity, name, price in cart_items:
+        item_total = price * quantity
+        text += f"🛍️ {name}\n 💰 {price}€ × {quantity} = {item_total:.2f}€\n\n"
+        total += item_total
+    text += f"💵 Total: {total:.2f}€ (${total * USD_RATE:.2f})"
+    keyboard = [
+        [InlineKeyboardButton("💰 Checkout All", callback_data="checkout_all"), InlineKeyboardButton("🗑️ Clear Cart", callback_data="clear_cart")],
+        [InlineKeyboardButton("🛍️ Continue Shopping", callback_data="continue_shopping"), InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")],
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def legacy_payment_settings(payment_methods):
+    text = "💳 Payment Settings:\n\n"
+    keyboard = []
+    for currency_code, address, blockchain in payment_methods:
+        currency_name = {
+            'btc': '₿ Bitcoin', 'eth': 'Ξ Ethereum', 'sol': '◎ Solana', 'ltc': '💎 Litecoin', 'usdt': '💵 USDT'
+        }.get(currency_code, currency_code.upper())
+        text += f"{currency_name}:\n`{address}`\n\n"
+        keyboard.append([
+            InlineKeyboardButton(f"✏️ Edit {currency_name}", callback_data=f"edit_payment_{currency_code}"),
+            InlineKeyboardButton(f"🗑️ Remove {currency_name}", callback_data=f"remove_payment_{currency_code}"),
+        ])
+    keyboard.append([InlineKeyboardButton("➕ Add New Crypto", callback_data="add_new_crypto")])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Admin Panel", callback_data="admin_panel")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+# The same screens through the registry
+def registry_main_menu():
+    return templates.keyboard('main_menu')
+
+
+def registry_cart(cart_items):
+    rows = [(name, price, quantity, price * quantity) for product_id, quantity, name, price in cart_items]
+    total = sum(row[3] for row in rows)
+    text = templates.render('cart', items=templates.render_rows('cart_item', rows), total=total, usd_total=total * USD_RATE)
+    return text, templates.keyboard('cart', False)
+
+
+def registry_payment_settings(payment_methods):
+    text = templates.render(
+        'payment_settings',
+        methods=templates.render_rows('payment_settings_item', [(currency_label(code), address) for code, address, blockchain in payment_methods])
+    )
+    return text, templates.keyboard('payment_settings', tuple(method[0] for method in payment_methods))
+
+
+def main():
+    small, large = cart_rows(5), cart_rows(50)
+    assert legacy_cart(large)[0] == registry_cart(large)[0]
+    assert legacy_payment_settings(ADDRESSES)[0] == registry_payment_settings(ADDRESSES)[0]
+    
+    screens = [
+        ("main menu keyboard", legacy_main_menu, registry_main_menu),
+        ("cart, 5 items", lambda: legacy_cart(small), lambda: registry_cart(small)),
+        ("cart, 50 items", lambda: legacy_cart(large), lambda: registry_cart(large)),
+        ("payment settings", lambda: legacy_payment_settings(ADDRESSES), lambda: registry_payment_settings(ADDRESSES)),
+    ]
+    
+    rounds = 5000
+    print(f"{'screen':<22} {'inline':>10} {'registry':>10}")
+    for name, legacy, registry in screens:
+        legacy_us = timeit.timeit(legacy, number=rounds) / rounds * 1e6
+        registry_us = timeit.timeit(registry, number=rounds) / rounds * 1e6
+        print(f"{name:<22} {legacy_us:>8.1f}us {registry_us:>8.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# Update throughput of the supervisor + N worker processes under a synthetic
+# callback-query load. Telegram is replaced by an in-process stub with a
+# fixed round-trip delay, so the numbers reflect handler, database and
+# routing cost; expect them to scale until workers outnumber cores.
+#
+#   python benchmarks/bench_workers.py [workers ...]
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('BOT_TOKEN', '0:bench')
+os.environ.setdefault('ADMIN_ID', '1')
+# Also runs in every spawned worker, which re-imports this script
+logging.disable(logging.INFO)
+
+from telegram import Update
+from telegram.request import BaseRequest
+from telegram.warnings import PTBUserWarning
+
+warnings.filterwarnings('ignore', category=PTBUserWarning)
+
+USERS = 500
+UPDATES = 6000
+PRODUCTS = 200
+API_DELAY = 0.002
+DISPATCH_BATCH = 100
+FLOW = ["main_menu", "browse_products", "product_{p}", "add_to_cart_{p}", "view_cart"]
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeRequest(BaseRequest):
+    # Answers every Bot API call after API_DELAY seconds
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint == 'sendMessage':
+            result = {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "-"}
+        else:
+            await asyncio.sleep(API_DELAY)
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def synthetic_updates():
+    updates = []
+    for n in range(UPDATES):
+        user_id = 1000 + n % USERS
+        step = (n // USERS) % len(FLOW)
+        data = FLOW[step].format(p=1 + (user_id * 7 + n // USERS) % PRODUCTS)
+        updates.append(Update.de_json({
+            "update_id": n + 1,
+            "callback_query": {
+                "id": str(n + 1),
+                "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": 10,
+                    "date": 0,
+                    "chat": {"id": user_id, "type": "private"},
+                    "text": "-",
+                },
+            },
+        }, None))
+    return updates
+
+
+def seed(path):
+    from database import Database
+    db = Database(path)
+    with db.connection() as conn:
+        conn.executemany(
+            'INSERT INTO products (name, price, description, quantity) VALUES (?, ?, ?, ?)',
+            [(f"Product {i:05d}", 10 + i % 50, "bench", 1000) for i in range(PRODUCTS)]
+        )
+        conn.commit()
+    db.close()
+
+
+async def measure(count, updates):
+    from config import Config
+    from workers import Supervisor
+
+    # Fresh database per run; workers read DB_PATH from the environment
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DB_PATH'] = path
+    seed(path)
+    config = Config()
+    config.DB_PATH = path
+
+    supervisor = Supervisor(config, count, request_class=FakeRequest)
+    await supervisor.start()
+    started = time.perf_counter()
+    for i in range(0, len(updates), DISPATCH_BATCH):
+        await supervisor.dispatch(updates[i:i + DISPATCH_BATCH])
+    await supervisor.stop(timeout=600)
+    elapsed = time.perf_counter() - started
+
+    processed = sum(result['processed'] for result in supervisor.results.values())
+    return elapsed, processed, supervisor.routed
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4]
+    updates = synthetic_updates()
+    print(f"{len(updates)} updates from {USERS} users, {os.cpu_count()} CPUs, {API_DELAY * 1000:.0f}ms API delay")
+    print(f"{'workers':>7} {'seconds':>8} {'updates/s':>10} {'speedup':>8}  routed")
+    baseline = None
+    for count in counts:
+        elapsed, processed, routed = asyncio.run(measure(count, updates))
+        rate = processed / elapsed
+        baseline = baseline or rate
+        print(f"{count:>7} {elapsed:>8.2f} {rate:>10.0f} {rate / baseline:>7.2f}x  {routed}")
+
+
+if __name__ == '__main__':
+    main()
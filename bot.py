@@ -1,4 +1,5 @@
 import logging
+import secrets
 from telegram import Update
 from telegram.ext import (
     Application, 
@@ -13,6 +14,11 @@ from telegram.ext import (
 from config import Config
 from client_handlers import ClientHandlers
 from admin_handlers import AdminHandlers
+from store import Store
+from rates import rate_cache
+from router import CallbackRouter
+from processor import PerUserUpdateProcessor
+from persistence import SQLitePersistence
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -20,11 +26,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Callbacks that start the admin text conversations
+ADD_PRODUCT_PATTERN = "^add_new_product$"
+EDIT_CONTENT_PATTERN = "^edit_content_"
+
+def webhook_settings(config):
+    if not config.WEBHOOK_URL:
+        raise ValueError("WEBHOOK_URL must be set when BOT_MODE is 'webhook'")
+    
+    # Telegram echoes the secret in X-Telegram-Bot-Api-Secret-Token and
+    # requests without it are rejected. set_webhook runs on every start,
+    # so a per-process random secret works when none is configured.
+    secret = config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+    path = config.WEBHOOK_PATH.strip('/')
+    
+    return {
+        'listen': config.WEBHOOK_LISTEN,
+        'port': config.WEBHOOK_PORT,
+        'url_path': path,
+        'webhook_url': f"{config.WEBHOOK_URL.rstrip('/')}/{path}",
+        'secret_token': secret,
+        'max_connections': config.WEBHOOK_MAX_CONNECTIONS,
+    }
+
 class StoreBot:
-    def __init__(self):
-        self.config = Config()
-        self.client = ClientHandlers(self.config)
-        self.admin = AdminHandlers(self.config)
+    def __init__(self, config=None, name='default', executor=None, shard=None):
+        self.config = config or Config()
+        self.name = name
+        self.shard = shard
+        self.store = Store(self.config, name, executor=executor, shard=shard)
+        self.client = ClientHandlers(self.store)
+        self.admin = AdminHandlers(self.store)
+        
+        self.router = CallbackRouter()
+        self.router.register(self.client)
+        self.router.register(self.admin)
         
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
@@ -38,103 +74,81 @@ class StoreBot:
         query = update.callback_query
         await query.answer()
         
-        data = query.data
-        
-        # Client handlers
-        if data == "browse_products":
-            await self.client.show_products(update, context)
-        elif data == "view_cart":
-            await self.client.show_cart(update, context)
-        elif data == "about":
-            await self.client.show_about(update, context)
-        elif data == "contact":
-            await self.client.show_contact(update, context)
-        elif data == "website":
-            await self.client.show_website(update, context)
-        elif data == "rules":
-            await self.client.show_rules(update, context)
-        elif data == "faq":
-            await self.client.show_faq(update, context)
-        elif data == "main_menu":
-            await self.client.show_main_menu(update, context)
-        elif data.startswith("product_"):
-            product_id = int(data.split("_")[1])
-            await self.client.show_product_detail(update, context, product_id)
-        elif data.startswith("add_to_cart_"):
-            product_id = int(data.split("_")[3])
-            await self.client.add_to_cart(update, context, product_id)
-        elif data == "back_to_products":
-            await self.client.show_products(update, context)
-        elif data == "continue_shopping":
-            await self.client.show_products(update, context)
-        elif data == "clear_cart":
-            await self.client.clear_cart(update, context)
-        elif data == "checkout_all":
-            await self.client.start_checkout(update, context)
-        elif data.startswith("buy_now_"):
-            product_id = int(data.split("_")[2])
-            await self.client.buy_now(update, context, product_id)
-        elif data == "no_discount":
-            await self.client.show_payment_methods(update, context)
-        elif data == "continue_to_payment":
-            await self.client.ask_discount_code(update, context)
-        elif data.startswith("payment_"):
-            currency = data.split("_")[1]
-            await self.client.show_payment_details(update, context, currency)
-        elif data == "payment_made":
-            await self.client.ask_payment_source_address(update, context)
-        elif data == "back_to_payment_methods":
-            await self.client.show_payment_methods(update, context)
-        
-        # Admin handlers
-        elif data == "admin_panel":
-            await self.admin.show_admin_panel(update, context)
-        elif data == "product_management":
-            await self.admin.show_product_management(update, context)
-        elif data == "content_management":
-            await self.admin.show_content_management(update, context)
-        elif data == "payment_settings":
-            await self.admin.show_payment_settings(update, context)
-        elif data == "discount_codes":
-            await self.admin.show_discount_management(update, context)
-        elif data == "statistics":
-            await self.admin.show_statistics(update, context)
-        elif data == "add_new_product":
-            await self.admin.start_add_product(update, context)
-        elif data.startswith("edit_product_"):
-            product_id = int(data.split("_")[2])
-            await self.admin.show_product_edit(update, context, product_id)
-        elif data.startswith("delete_product_"):
-            product_id = int(data.split("_")[2])
-            await self.admin.confirm_delete_product(update, context, product_id)
-        elif data.startswith("confirm_delete_"):
-            product_id = int(data.split("_")[2])
-            await self.admin.delete_product(update, context, product_id)
-        elif data.startswith("cancel_delete_"):
-            product_id = int(data.split("_")[2])
-            await self.admin.show_product_edit(update, context, product_id)
-        
-        # Admin payment confirmation
-        elif data.startswith("admin_confirm_"):
-            order_id = data.split("_")[2]
-            await self.admin.ask_admin_confirmation(update, context, order_id)
-        elif data.startswith("admin_confirm_yes_"):
-            order_id = data.split("_")[3]
-            await self.admin.confirm_payment(update, context, order_id)
-        elif data.startswith("admin_confirm_no_"):
-            order_id = data.split("_")[3]
-            await self.admin.cancel_confirmation(update, context, order_id)
-        elif data.startswith("admin_reject_"):
-            order_id = data.split("_")[2]
-            await self.admin.reject_payment(update, context, order_id)
+        await self.router.dispatch(update, context)
+
+    async def post_init(self, application):
+        await self.store.start(application)
+        # Quotes are the same for every tenant, so rate_cache stays a
+        # process-wide singleton, refreshed until the last tenant stops
+        await rate_cache.start(application)
+
+    async def post_stop(self, application):
+        await rate_cache.stop(application)
+        await self.store.stop(application)
+
+    async def leave_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Any regular button tapped while a prompt is open closes the prompt
+        # and does what the button says
+        await self.button_handler(update, context)
+        return ConversationHandler.END
+
+    async def hand_over_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # An admin flow started while a prompt is open: close the prompt and
+        # enter that flow with the same update, so the admin's next text goes
+        # to the new prompt and not to the one left behind
+        for conversation in self.admin_conversations:
+            check = conversation.check_update(update)
+            if check is not None and check is not False:
+                await conversation.handle_update(update, context.application, check, context)
+                break
+        return ConversationHandler.END
+
+    async def restart_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.start(update, context)
+        return ConversationHandler.END
+
+    async def cancel_conversation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.client.show_main_menu(update, context)
+        return ConversationHandler.END
 
     def setup_handlers(self, application):
+        # Customer text prompts (payment source address, discount code,
+        # search) share one conversation. Opening a prompt replaces whichever
+        # one the user left open (allow_reentry), so text always goes to the
+        # prompt shown last. Registered before the commands so /start can
+        # close an open prompt.
+        client_input_conv = ConversationHandler(
+            entry_points=[
+                CallbackQueryHandler(self.client.ask_payment_source_address, pattern="^payment_made$"),
+                CallbackQueryHandler(self.client.ask_discount_code, pattern="^continue_to_payment$"),
+                CallbackQueryHandler(self.client.ask_search_query, pattern="^search_products$"),
+            ],
+            states={
+                self.config.PAYMENT_SOURCE_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client.receive_payment_source_address)],
+                self.config.DISCOUNT_CODE_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client.receive_discount_code)],
+                self.config.SEARCH_QUERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client.receive_search_query)],
+            },
+            fallbacks=[
+                CommandHandler("start", self.restart_conversation),
+                CommandHandler("cancel", self.cancel_conversation),
+                CallbackQueryHandler(self.hand_over_conversation, pattern=f"{ADD_PRODUCT_PATTERN}|{EDIT_CONTENT_PATTERN}"),
+                CallbackQueryHandler(self.leave_conversation, pattern=self.router.resolve),
+            ],
+            name="client_input",
+            persistent=True,
+            allow_reentry=True,
+        )
+        
+        application.add_handler(client_input_conv)
+        
         application.add_handler(CommandHandler("start", self.start))
-        application.add_handler(CallbackQueryHandler(self.button_handler))
+        application.add_handler(CommandHandler("search", self.client.search_command))
+        application.add_handler(CommandHandler("rebuild_stats", self.admin.rebuild_counters))
+        application.add_handler(CommandHandler("export", self.admin.export_orders))
         
         # Add product conversation
         add_product_conv = ConversationHandler(
-            entry_points=[CallbackQueryHandler(self.admin.start_add_product, pattern="^add_new_product$")],
+            entry_points=[CallbackQueryHandler(self.admin.start_add_product, pattern=ADD_PRODUCT_PATTERN)],
             states={
                 self.config.PRODUCT_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.admin.receive_product_name)],
                 self.config.PRODUCT_PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.admin.receive_product_price)],
@@ -146,39 +160,76 @@ class StoreBot:
                 self.config.PRODUCT_COORDINATES: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.admin.receive_product_coordinates)],
             },
             fallbacks=[],
+            name="add_product",
+            persistent=True,
         )
         
         application.add_handler(add_product_conv)
         
-        # Payment source address handler
-        payment_conv = ConversationHandler(
-            entry_points=[CallbackQueryHandler(self.client.ask_payment_source_address, pattern="^payment_made$")],
+        # Content editing conversation
+        content_conv = ConversationHandler(
+            entry_points=[CallbackQueryHandler(self.admin.start_edit_content, pattern=EDIT_CONTENT_PATTERN)],
             states={
-                self.config.PAYMENT_SOURCE_ADDRESS: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client.receive_payment_source_address)],
+                self.config.CONTENT_EDIT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.admin.receive_content_edit)],
             },
             fallbacks=[],
+            name="content",
+            persistent=True,
         )
         
-        application.add_handler(payment_conv)
+        application.add_handler(content_conv)
+        self.admin_conversations = [add_product_conv, content_conv]
         
-        # Discount code input handler
-        discount_conv = ConversationHandler(
-            entry_points=[CallbackQueryHandler(self.client.ask_discount_code, pattern="^continue_to_payment$")],
-            states={
-                self.config.DISCOUNT_CODE_INPUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.client.receive_discount_code)],
-            },
-            fallbacks=[],
-        )
+        # Bulk product import from an uploaded CSV/XLSX document
+        application.add_handler(MessageHandler(filters.Document.ALL, self.admin.receive_import_file))
         
-        application.add_handler(discount_conv)
+        # Registered last so conversation entry points get their callbacks first
+        application.add_handler(CallbackQueryHandler(self.button_handler))
 
-    def run(self):
-        application = Application.builder().token(self.config.BOT_TOKEN).build()
+    def build_application(self, request=None):
+        builder = (
+            Application.builder()
+            .token(self.config.BOT_TOKEN)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .concurrent_updates(PerUserUpdateProcessor(self.config.UPDATE_WORKERS))
+            .persistence(SQLitePersistence(self.store.db, update_interval=self.config.PERSISTENCE_INTERVAL, shard=self.shard))
+        )
+        if self.shard is not None:
+            # Worker processes get their updates from the supervisor
+            builder = builder.updater(None)
+        if request is not None:
+            builder = builder.request(request)
+        application = builder.build()
         self.setup_handlers(application)
+        return application
+
+    def run(self):
+        application = self.build_application()
         
-        logger.info("Bot is running...")
-        application.run_polling()
+        # On SIGINT/SIGTERM both modes stop taking updates, finish the ones
+        # already received, then drain the outbox (post_stop) before exiting
+        if self.config.BOT_MODE == 'webhook':
+            self.run_webhook(application)
+        else:
+            logger.info("Bot is running (polling)...")
+            application.run_polling()
+
+    def run_webhook(self, application):
+        settings = webhook_settings(self.config)
+        logger.info(f"Bot is running (webhook on {settings['listen']}:{settings['port']}/{settings['url_path']})...")
+        application.run_webhook(**settings)
 
 if __name__ == '__main__':
-    bot = StoreBot()
-    bot.run()
+    if Config.TENANTS_FILE:
+        # Each tenant brings its own ADMIN_ID (checked by load_tenants)
+        from tenants import run_tenants
+        run_tenants(Config.TENANTS_FILE)
+    elif not Config.ADMIN_ID:
+        raise ValueError("ADMIN_ID is not set")
+    elif Config.WORKER_PROCESSES > 1:
+        from workers import run_workers
+        run_workers(Config(), Config.WORKER_PROCESSES)
+    else:
+        bot = StoreBot()
+        bot.run()
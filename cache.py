@@ -0,0 +1,188 @@
+import asyncio
+import logging
+from collections import namedtuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+class ContentCache:
+    def __init__(self, database):
+        self.db = database
+        self._values = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT key, value FROM content')
+            self._values = dict(cursor.fetchall())
+        self.version += 1
+        logger.info(f"Loaded {len(self._values)} content entries into cache")
+
+    async def get(self, key: str, default: str = "Content not found") -> str:
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+        
+        self.misses += 1
+        result = await self.db.fetchone('SELECT value FROM content WHERE key = ?', (key,))
+        if not result:
+            return default
+        
+        self._values[key] = result[0]
+        return result[0]
+
+    async def set(self, key: str, value: str):
+        # Write-through: the database is updated first, then the cached copy
+        await self.db.execute('''
+            INSERT INTO content (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP
+        ''', (key, value))
+        self._values[key] = value
+        self.version += 1
+
+    def invalidate(self, key: str = None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+        self.version += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._values),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'version': self.version,
+        }
+
+# Immutable view of one page of the browsable catalog at one catalog version
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['version', 'products', 'text', 'reply_markup'])
+
+# Pages memoized per catalog version; cleared wholesale when exceeded
+MAX_CACHED_PAGES = 256
+
+class CatalogCache:
+    def __init__(self, database, page_size=10):
+        self.db = database
+        self.page_size = page_size
+        self.version = 0
+        self.rebuilds = 0
+        self._pages = {}
+        self._pages_version = 0
+
+    def invalidate(self):
+        # Called after any write that changes what show_products displays:
+        # product add/edit/delete and stock changes.
+        self.version += 1
+
+    async def snapshot(self, direction=None, anchor_id=None) -> CatalogSnapshot:
+        if self._pages_version != self.version:
+            self._pages = {}
+            self._pages_version = self.version
+        
+        key = (direction, anchor_id) if direction else None
+        snapshot = self._pages.get(key)
+        if snapshot is not None:
+            return snapshot
+        
+        version = self.version
+        products, has_prev, has_next = await self.db.fetch_product_page(
+            'id, name, price, quantity',
+            'active = TRUE AND quantity > 0',
+            direction, anchor_id, self.page_size
+        )
+        snapshot = self._build(version, products, has_prev, has_next)
+        
+        # A write may have landed while we were reading; only publish the
+        # snapshot if it is still current, otherwise the next call rebuilds.
+        if version == self.version == self._pages_version:
+            if len(self._pages) >= MAX_CACHED_PAGES:
+                self._pages.clear()
+            self._pages[key] = snapshot
+            self.rebuilds += 1
+        return snapshot
+
+    def _build(self, version, products, has_prev, has_next):
+        if not products:
+            text = "🛍️ Our Products:\n\nNo products available at the moment."
+        else:
+            text = "🛍️ Our Products:"
+        
+        keyboard = []
+        for product in products:
+            product_id, name, price, quantity = product
+            button_text = f"{name} - {price}€" if quantity == 1 else f"{name} - {price}€ ({quantity} pcs)"
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"product_{product_id}")])
+        
+        navigation = []
+        if has_prev:
+            navigation.append(InlineKeyboardButton("◀️ Previous", callback_data=f"products_prev_{products[0][0]}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"products_next_{products[-1][0]}"))
+        if navigation:
+            keyboard.append(navigation)
+        
+        keyboard.append([
+            InlineKeyboardButton("🛒 View Cart", callback_data="view_cart"),
+            InlineKeyboardButton("🔙 Back", callback_data="main_menu")
+        ])
+        
+        return CatalogSnapshot(version, tuple(products), text, InlineKeyboardMarkup(keyboard))
+
+class CacheSync:
+    # In worker mode several processes share one database but each holds
+    # its own caches. Triggers bump cache_versions on every write to the
+    # products/content tables; polling that one tiny table every `interval`
+    # seconds tells this process which caches other workers made stale.
+    def __init__(self, database, content_cache, catalog_cache, interval: float = 1.0):
+        self.database = database
+        self.content_cache = content_cache
+        self.catalog_cache = catalog_cache
+        self.interval = interval
+        self._versions = None
+        self._task = None
+        self.invalidations = 0
+    
+    async def start(self, application=None):
+        if self._task is None:
+            self._versions = await self.database.run(self._read)
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self, application=None):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    @staticmethod
+    def _read(conn):
+        return dict(conn.execute('SELECT name, version FROM cache_versions'))
+    
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Cache version check failed: {e}")
+    
+    async def check(self):
+        versions = await self.database.run(self._read)
+        # Our own writes come back here as well; that costs one extra
+        # reload, not a stale read
+        if versions.get('content') != self._versions.get('content'):
+            self.content_cache.invalidate()
+            self.invalidations += 1
+        if versions.get('catalog') != self._versions.get('catalog'):
+            self.catalog_cache.invalidate()
+            self.invalidations += 1
+        self._versions = versions
+    
+    def stats(self):
+        return {
+            'invalidations': self.invalidations,
+        }
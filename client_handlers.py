@@ -1,71 +1,48 @@
 import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from database import db
+from router import callback
+from sessions import touch_checkout, clear_checkout
+from rates import rate_cache
+from templates import currency_name
 import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 class ClientHandlers:
-    def __init__(self, config):
-        self.config = config
-        self.exchange_rate = config.EXCHANGE_RATE
-
-    def get_content(self, key: str) -> str:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT value FROM content WHERE key = ?', (key,))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else "Content not found"
-
-    async def show_products(self, update, context):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, price, quantity FROM products 
-            WHERE active = TRUE AND quantity > 0
-            ORDER BY name
-        ''')
-        products = cursor.fetchall()
-        conn.close()
-        
-        if not products:
-            text = "🛍️ Our Products:\n\nNo products available at the moment."
-        else:
-            text = "🛍️ Our Products:"
-        
-        keyboard = []
-        for product in products:
-            product_id, name, price, quantity = product
-            button_text = f"{name} - {price}€" if quantity == 1 else f"{name} - {price}€ ({quantity} pcs)"
-            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"product_{product_id}")])
-        
-        keyboard.append([
-            InlineKeyboardButton("🛒 View Cart", callback_data="view_cart"),
-            InlineKeyboardButton("🔙 Back", callback_data="main_menu")
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    def __init__(self, store):
+        self.store = store
+        self.config = store.config
+        self.db = store.db
+        self.content_cache = store.content_cache
+        self.catalog_cache = store.catalog_cache
+        self.outbox = store.outbox
+        self.templates = store.templates
+        self.edit_message = store.render_cache.edit_message
+
+    async def get_content(self, key: str) -> str:
+        return await self.content_cache.get(key)
+
+    @callback("browse_products")
+    @callback("back_to_products")
+    @callback("continue_shopping")
+    @callback("products_", str, int)
+    async def show_products(self, update, context, direction=None, product_id=None):
+        snapshot = await self.catalog_cache.snapshot(direction, product_id)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, snapshot.text, reply_markup=snapshot.reply_markup)
 
+    @callback("product_", int)
     async def show_product_detail(self, update, context, product_id: int):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        product = await self.db.fetchone('''
             SELECT name, description, price, quantity FROM products 
             WHERE id = ? AND active = TRUE
         ''', (product_id,))
-        product = cursor.fetchone()
-        conn.close()
         
         if not product:
-            await update.callback_query.edit_message_text("Product not found!")
+            await self.edit_message(update.callback_query, "Product not found!")
             return
         
         name, description, price, quantity = product
@@ -90,112 +67,155 @@ class ClientHandlers:
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
-    async def add_to_cart(self, update, context, product_id: int):
-        user_id = update.callback_query.from_user.id
+    async def ask_search_query(self, update, context):
+        keyboard = [[InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")]]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await self.edit_message(update.callback_query, "🔎 Send the product name or keywords to search for:", reply_markup=reply_markup)
+        return self.config.SEARCH_QUERY
+
+    async def receive_search_query(self, update, context):
+        context.user_data['search_query'] = update.message.text
+        context.user_data['search_pages'] = [None]
+        text, reply_markup = await self.render_search_results(context, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+        return ConversationHandler.END
+
+    async def search_command(self, update, context):
+        search_text = ' '.join(context.args)
+        if not search_text:
+            await update.message.reply_text("Usage: /search <keywords>")
+            return
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        context.user_data['search_query'] = search_text
+        context.user_data['search_pages'] = [None]
+        text, reply_markup = await self.render_search_results(context, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+    @callback("search_page_", int)
+    async def show_search_results(self, update, context, page: int):
+        text, reply_markup = await self.render_search_results(context, page)
         
-        cursor.execute('SELECT name, price, quantity FROM products WHERE id = ? AND active = TRUE', (product_id,))
-        product = cursor.fetchone()
+        query = update.callback_query
+        await self.edit_message(query, text, reply_markup=reply_markup)
+
+    async def render_search_results(self, context, page: int):
+        # search_pages holds the keyset key each page starts after; a page
+        # not reached from the one before it (stale button) starts over
+        search_text = context.user_data.get('search_query', '')
+        pages = context.user_data.setdefault('search_pages', [None])
+        if page >= len(pages):
+            page = 0
+        products, next_key = await self.db.search_products(search_text, pages[page], self.config.PRODUCTS_PAGE_SIZE)
+        has_next = next_key is not None
+        if has_next:
+            del pages[page + 1:]
+            pages.append(list(next_key))
+        
+        if products:
+            text = f"🔎 Results for \"{search_text}\":"
+        else:
+            text = f"🔎 No products found for \"{search_text}\"."
         
-        if not product:
-            await update.callback_query.answer("Product not available!", show_alert=True)
-            return
+        keyboard = []
+        for product in products:
+            product_id, name, price, quantity = product
+            button_text = f"{name} - {price}€" if quantity == 1 else f"{name} - {price}€ ({quantity} pcs)"
+            keyboard.append([InlineKeyboardButton(button_text, callback_data=f"product_{product_id}")])
         
-        name, price, available_quantity = product
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️ Previous", callback_data=f"search_page_{page - 1}"))
+        if has_next:
+            navigation.append(InlineKeyboardButton("Next ▶️", callback_data=f"search_page_{page + 1}"))
+        if navigation:
+            keyboard.append(navigation)
         
-        cursor.execute('SELECT quantity FROM cart WHERE user_id = ? AND product_id = ?', (user_id, product_id))
-        existing_item = cursor.fetchone()
+        keyboard.append([
+            InlineKeyboardButton("🔎 New Search", callback_data="search_products"),
+            InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")
+        ])
         
-        if existing_item:
-            current_quantity = existing_item[0]
-            if current_quantity + 1 > available_quantity:
-                await update.callback_query.answer("Not enough quantity available!", show_alert=True)
-                return
-            cursor.execute(
-                'UPDATE cart SET quantity = quantity + 1 WHERE user_id = ? AND product_id = ?',
-                (user_id, product_id)
-            )
-        else:
-            cursor.execute(
-                'INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, 1)',
-                (user_id, product_id)
-            )
+        return text, InlineKeyboardMarkup(keyboard)
+
+    @callback("add_to_cart_", int)
+    async def add_to_cart(self, update, context, product_id: int):
+        user_id = update.callback_query.from_user.id
         
-        conn.commit()
-        conn.close()
+        def _add(conn):
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT name, price, quantity FROM products WHERE id = ? AND active = TRUE', (product_id,))
+            product = cursor.fetchone()
+            
+            if not product:
+                return "Product not available!", True
+            
+            name, price, available_quantity = product
+            
+            cursor.execute('SELECT quantity FROM cart WHERE user_id = ? AND product_id = ?', (user_id, product_id))
+            existing_item = cursor.fetchone()
+            
+            if existing_item:
+                current_quantity = existing_item[0]
+                if current_quantity + 1 > available_quantity:
+                    return "Not enough quantity available!", True
+                cursor.execute(
+                    'UPDATE cart SET quantity = quantity + 1, added_at = CURRENT_TIMESTAMP WHERE user_id = ? AND product_id = ?',
+                    (user_id, product_id)
+                )
+            else:
+                cursor.execute(
+                    'INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, 1)',
+                    (user_id, product_id)
+                )
+            
+            conn.commit()
+            return f"Added {name} to cart!", False
         
-        await update.callback_query.answer(f"Added {name} to cart!")
+        message, show_alert = await self.db.run(_add)
+        await update.callback_query.answer(message, show_alert=show_alert)
 
+    @callback("view_cart")
     async def show_cart(self, update, context):
         user_id = update.callback_query.from_user.id
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        cart_items = await self.db.fetchall('''
             SELECT c.product_id, c.quantity, p.name, p.price 
             FROM cart c 
             JOIN products p ON c.product_id = p.id 
             WHERE c.user_id = ? AND p.active = TRUE
         ''', (user_id,))
-        cart_items = cursor.fetchall()
-        conn.close()
         
         if not cart_items:
-            text = "🛒 Your cart is empty!"
-            keyboard = [
-                [
-                    InlineKeyboardButton("🛍️ Continue Shopping", callback_data="browse_products"),
-                    InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")
-                ]
-            ]
+            text = self.templates.render('cart_empty')
         else:
-            text = "🛒 Your Cart:\n\n"
-            total = 0
-            total_items = 0
-            
-            for item in cart_items:
-                product_id, quantity, name, price = item
-                item_total = price * quantity
-                text += f"🛍️ {name}\n 💰 {price}€ × {quantity} = {item_total:.2f}€\n\n"
-                total += item_total
-                total_items += quantity
-            
-            usd_total = total * self.exchange_rate
-            text += f"💵 Total: {total:.2f}€ (${usd_total:.2f})"
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("💰 Checkout All", callback_data="checkout_all"),
-                    InlineKeyboardButton("🗑️ Clear Cart", callback_data="clear_cart")
-                ],
-                [
-                    InlineKeyboardButton("🛍️ Continue Shopping", callback_data="continue_shopping"),
-                    InlineKeyboardButton("🔙 Main Menu", callback_data="main_menu")
-                ]
-            ]
+            rows = [(name, price, quantity, price * quantity) for product_id, quantity, name, price in cart_items]
+            total = sum(row[3] for row in rows)
+            text = self.templates.render(
+                'cart',
+                items=self.templates.render_rows('cart_item', rows),
+                total=total,
+                usd_total=rate_cache.convert(total, 'usd')
+            )
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.templates.keyboard('cart', not cart_items)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("clear_cart")
     async def clear_cart(self, update, context):
         user_id = update.callback_query.from_user.id
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
-        conn.commit()
-        conn.close()
+        await self.db.execute('DELETE FROM cart WHERE user_id = ?', (user_id,))
         
         await update.callback_query.answer("Cart cleared!")
         await self.show_cart(update, context)
 
+    @callback("buy_now_", int)
     async def buy_now(self, update, context, product_id: int):
         context.user_data['current_order'] = {
             'type': 'single',
@@ -204,16 +224,13 @@ class ClientHandlers:
         }
         await self.start_checkout(update, context)
 
+    @callback("checkout_all")
     async def start_checkout(self, update, context):
         user_id = update.callback_query.from_user.id
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
         if 'current_order' in context.user_data and context.user_data['current_order']['type'] == 'single':
             product_id = context.user_data['current_order']['product_id']
-            cursor.execute('SELECT name, price FROM products WHERE id = ?', (product_id,))
-            product = cursor.fetchone()
+            product = await self.db.fetchone('SELECT name, price FROM products WHERE id = ?', (product_id,))
             
             if product:
                 name, price = product
@@ -221,13 +238,12 @@ class ClientHandlers:
                 context.user_data['checkout_total'] = total
                 context.user_data['checkout_items'] = [{'product_id': product_id, 'name': name, 'price': price, 'quantity': 1}]
         else:
-            cursor.execute('''
+            cart_items = await self.db.fetchall('''
                 SELECT c.product_id, c.quantity, p.name, p.price 
                 FROM cart c 
                 JOIN products p ON c.product_id = p.id 
                 WHERE c.user_id = ?
             ''', (user_id,))
-            cart_items = cursor.fetchall()
             
             total = 0
             checkout_items = []
@@ -245,13 +261,13 @@ class ClientHandlers:
             context.user_data['checkout_total'] = total
             context.user_data['checkout_items'] = checkout_items
         
-        conn.close()
-        
+        touch_checkout(context.user_data)
         await self.ask_discount_code(update, context)
 
+    @callback("continue_to_payment")
     async def ask_discount_code(self, update, context):
         total = context.user_data.get('checkout_total', 0)
-        usd_total = total * self.exchange_rate
+        usd_total = rate_cache.convert(total, 'usd')
         
         text = f"""💰 {total:.2f}€ (${usd_total:.2f})
 
@@ -267,7 +283,7 @@ Do you have a discount code? Enter it below or press 'No Code' to continue:"""
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
         
         return self.config.DISCOUNT_CODE_INPUT
 
@@ -275,15 +291,11 @@ Do you have a discount code? Enter it below or press 'No Code' to continue:"""
         discount_code = update.message.text.upper()
         user_id = update.effective_user.id
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        code_data = await self.db.fetchone('''
             SELECT discount_percentage, expiry_date, max_uses, used_count, is_general, client_id, client_username, active
             FROM discount_codes 
             WHERE code = ? AND active = TRUE
         ''', (discount_code,))
-        code_data = cursor.fetchone()
         
         if not code_data:
             await update.message.reply_text("❌ Invalid discount code. Please try again or press 'No Code':")
@@ -313,8 +325,9 @@ Do you have a discount code? Enter it below or press 'No Code' to continue:"""
         
         context.user_data['discount_code'] = discount_code
         context.user_data['checkout_total'] = new_total
+        touch_checkout(context.user_data)
         
-        usd_new_total = new_total * self.exchange_rate
+        usd_new_total = rate_cache.convert(new_total, 'usd')
         
         text = f"""🎫 Discount Applied!
 💰 Original: {original_total:.2f}€
@@ -330,105 +343,68 @@ Do you have a discount code? Enter it below or press 'No Code' to continue:"""
         await update.message.reply_text(text, reply_markup=reply_markup)
         return ConversationHandler.END
 
+    @callback("no_discount")
+    @callback("back_to_payment_methods")
     async def show_payment_methods(self, update, context):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT currency_code, address, blockchain FROM payment_settings')
-        payment_methods = cursor.fetchall()
-        conn.close()
+        payment_methods = await self.db.fetchall('SELECT currency_code, address, blockchain FROM payment_settings')
         
         total = context.user_data.get('checkout_total', 0)
-        usd_total = total * self.exchange_rate
+        usd_total = rate_cache.convert(total, 'usd')
         
         if 'current_order' in context.user_data and context.user_data['current_order']['type'] == 'single':
             product_id = context.user_data['current_order']['product_id']
-            conn = db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT name, price FROM products WHERE id = ?', (product_id,))
-            product = cursor.fetchone()
-            conn.close()
-            product_text = f"🛍️ {product[0]}\n💰 Price: {product[1]}€"
+            product = await self.db.fetchone('SELECT name, price FROM products WHERE id = ?', (product_id,))
+            product_text = self.templates.render('payment_methods_single', name=product[0], price=product[1])
         else:
-            product_text = "🛍️ Multiple products from cart"
+            product_text = self.templates.render('payment_methods_cart')
         
-        text = f"""💳 Choose payment method:
-
-{product_text}
-💰 Total: {total:.2f}€ (${usd_total:.2f})"""
-        
-        keyboard = []
-        for method in payment_methods:
-            currency_code, address, blockchain = method
-            currency_name = {
-                'btc': '₿ Bitcoin',
-                'eth': 'Ξ Ethereum', 
-                'sol': '◎ Solana',
-                'ltc': '💎 Litecoin',
-                'usdt': '💵 USDT'
-            }.get(currency_code, currency_code.upper())
-            
-            keyboard.append([InlineKeyboardButton(currency_name, callback_data=f"payment_{currency_code}")])
+        text = self.templates.render('payment_methods', product_text=product_text, total=total, usd_total=usd_total)
         
-        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="view_cart")])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.templates.keyboard('payment_methods', tuple(method[0] for method in payment_methods))
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("payment_", str)
     async def show_payment_details(self, update, context, currency: str):
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT address, blockchain FROM payment_settings WHERE currency_code = ?', (currency,))
-        payment_method = cursor.fetchone()
-        conn.close()
+        payment_method = await self.db.fetchone('SELECT address, blockchain FROM payment_settings WHERE currency_code = ?', (currency,))
         
         if not payment_method:
-            await update.callback_query.edit_message_text("Payment method not found!")
+            await self.edit_message(update.callback_query, "Payment method not found!")
             return
         
         address, blockchain = payment_method
         total = context.user_data.get('checkout_total', 0)
-        usd_total = total * self.exchange_rate
+        usd_total = rate_cache.convert(total, 'usd')
         
-        currency_name = {
-            'btc': 'Bitcoin',
-            'eth': 'Ethereum',
-            'sol': 'Solana', 
-            'ltc': 'Litecoin',
-            'usdt': 'USDT'
-        }.get(currency, currency.upper())
-        
-        text = f"""💳 **PAYMENT DETAILS**
-
-🛍️ {'Single product' if 'current_order' in context.user_data else 'Cart items'}
-💰 Total: {total:.2f}€ (${usd_total:.2f})
-⛓️ Blockchain: {blockchain}
-
-📧 **SEND PAYMENT TO ADDRESS:**
-`{address}`
-
-⚠️ **IMPORTANT:**
-• Send exactly {total:.2f}€ worth of {currency_name}
-• Copy address exactly
-
-After payment, click the button below:"""
+        # Quoted from the in-memory rate cache; without a fresh quote the
+        # customer is asked for the EUR value as before
+        crypto_amount = rate_cache.format(total, currency)
+        if crypto_amount:
+            send_line = self.templates.render('send_crypto_amount', amount=crypto_amount, total=total)
+        else:
+            send_line = self.templates.render('send_eur_worth', total=total, currency=currency_name(currency))
+        
+        text = self.templates.render(
+            'payment_details',
+            order_type='Single product' if 'current_order' in context.user_data else 'Cart items',
+            total=total,
+            usd_total=usd_total,
+            blockchain=blockchain,
+            address=address,
+            send_line=send_line
+        )
         
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ PAYMENT MADE", callback_data="payment_made"),
-                InlineKeyboardButton("🔙 Back to Payment Methods", callback_data="back_to_payment_methods")
-            ]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.templates.keyboard('payment_details')
         
         context.user_data['payment_currency'] = currency
         context.user_data['payment_address'] = address
+        touch_checkout(context.user_data)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
+    @callback("payment_made")
     async def ask_payment_source_address(self, update, context):
         text = """🔍 **PAYMENT CONFIRMATION**
 
@@ -438,7 +414,7 @@ Please enter the payment source address (where you sent from):
 
 Example: `1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa`"""
         
-        await update.callback_query.edit_message_text(text, parse_mode='Markdown')
+        await self.edit_message(update.callback_query, text, parse_mode='Markdown')
         return self.config.PAYMENT_SOURCE_ADDRESS
 
     async def receive_payment_source_address(self, update, context):
@@ -446,53 +422,62 @@ Example: `1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa`"""
         user = update.effective_user
         order_id = str(uuid.uuid4())[:8].upper()
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
         checkout_items = context.user_data.get('checkout_items', [])
         total = context.user_data.get('checkout_total', 0)
         currency = context.user_data.get('payment_currency')
         discount_code = context.user_data.get('discount_code')
+        from_cart = 'current_order' not in context.user_data
         
-        for item in checkout_items:
+        if not checkout_items:
+            # Checkout state was evicted by the session sweeper
+            await update.message.reply_text("⌛ Your checkout session has expired. Please start the checkout again.")
+            await self.show_main_menu(update, context)
+            return ConversationHandler.END
+        
+        def _place_order(conn):
+            cursor = conn.cursor()
+            
             cursor.execute('''
                 INSERT INTO orders 
-                (user_id, user_name, product_id, product_name, quantity, total_price, order_id, payment_currency, payment_source_address, discount_code)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                (order_id, user_id, user_name, total_price, payment_currency, payment_source_address, discount_code)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (
+                order_id,
                 user.id,
                 user.username or user.first_name,
-                item['product_id'],
-                item['name'],
-                item['quantity'],
                 total,
-                order_id,
                 currency,
                 payment_source,
                 discount_code
             ))
             
-            cursor.execute('''
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, product_id, product_name, price, quantity)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (order_id, item['product_id'], item['name'], item['price'], item['quantity'])
+                for item in checkout_items
+            ])
+            
+            cursor.executemany('''
                 UPDATE products SET quantity = quantity - ? WHERE id = ?
-            ''', (item['quantity'], item['product_id']))
-        
-        if 'current_order' not in context.user_data:
-            cursor.execute('DELETE FROM cart WHERE user_id = ?', (user.id,))
-        
-        if discount_code:
-            cursor.execute('''
-                UPDATE discount_codes SET used_count = used_count + 1 
-                WHERE code = ? AND (max_uses = -1 OR used_count < max_uses)
-            ''', (discount_code,))
+            ''', [(item['quantity'], item['product_id']) for item in checkout_items])
+            
+            if from_cart:
+                cursor.execute('DELETE FROM cart WHERE user_id = ?', (user.id,))
+            
+            if discount_code:
+                cursor.execute('''
+                    UPDATE discount_codes SET used_count = used_count + 1 
+                    WHERE code = ? AND (max_uses = -1 OR used_count < max_uses)
+                ''', (discount_code,))
+            
+            conn.commit()
         
-        conn.commit()
-        conn.close()
+        await self.db.run(_place_order)
+        self.catalog_cache.invalidate()
         
-        context.user_data.pop('checkout_total', None)
-        context.user_data.pop('checkout_items', None)
-        context.user_data.pop('payment_currency', None)
-        context.user_data.pop('current_order', None)
-        context.user_data.pop('discount_code', None)
+        clear_checkout(context.user_data)
         
         await self.notify_admin_of_payment(context, user, order_id, total, currency, payment_source, discount_code)
         
@@ -511,11 +496,7 @@ Admin will check your transaction and send products after confirmation."""
     async def notify_admin_of_payment(self, context, user, order_id: str, total: float, currency: str, payment_source: str, discount_code: str = None):
         user_info = f"@{user.username}" if user.username else user.first_name
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT product_name FROM orders WHERE order_id = ? LIMIT 1', (order_id,))
-        order = cursor.fetchone()
-        conn.close()
+        order = await self.db.fetchone('SELECT product_name FROM order_items WHERE order_id = ? ORDER BY id LIMIT 1', (order_id,))
         
         product_name = order[0] if order else "Cart checkout"
         
@@ -542,77 +523,61 @@ Is payment visible in your wallet?"""
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await context.bot.send_message(
-            chat_id=self.config.ADMIN_ID,
-            text=text,
-            reply_markup=reply_markup
-        )
+        self.outbox.send_message(self.config.ADMIN_ID, text, reply_markup=reply_markup)
 
+    @callback("about")
     async def show_about(self, update, context):
-        text = self.get_content('about_us')
+        text = await self.get_content('about_us')
         keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("contact")
     async def show_contact(self, update, context):
-        text = self.get_content('contact')
+        text = await self.get_content('contact')
         keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("website")
     async def show_website(self, update, context):
-        website_url = self.get_content('website')
+        website_url = await self.get_content('website')
         text = f"🌐 Visit our website: {website_url}"
         keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("rules")
     async def show_rules(self, update, context):
-        text = self.get_content('rules')
+        text = await self.get_content('rules')
         keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("faq")
     async def show_faq(self, update, context):
-        text = self.get_content('faq')
+        text = await self.get_content('faq')
         keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         query = update.callback_query
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await self.edit_message(query, text, reply_markup=reply_markup)
 
+    @callback("main_menu")
     async def show_main_menu(self, update, context):
-        welcome_message = self.get_content('welcome_message')
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("🛍️ Browse Products", callback_data="browse_products"),
-                InlineKeyboardButton("🛒 My Cart", callback_data="view_cart")
-            ],
-            [
-                InlineKeyboardButton("ℹ️ About Us", callback_data="about"),
-                InlineKeyboardButton("📞 Contact", callback_data="contact")
-            ],
-            [
-                InlineKeyboardButton("🌐 Website", callback_data="website"),
-                InlineKeyboardButton("📝 Rules", callback_data="rules")
-            ],
-            [
-                InlineKeyboardButton("🔍 FAQ", callback_data="faq")
-            ]
-        ]
+        welcome_message = await self.get_content('welcome_message')
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = self.templates.keyboard('main_menu')
         
         if hasattr(update, 'message') and update.message:
             await update.message.reply_text(welcome_message, reply_markup=reply_markup)
         else:
-            await update.callback_query.edit_message_text(welcome_message, reply_markup=reply_markup)
+            await self.edit_message(update.callback_query, welcome_message, reply_markup=reply_markup)
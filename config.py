@@ -3,11 +3,76 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Settings read once for the whole process (rates.rate_cache, the shared
+# database executor, the run mode), so a tenant cannot override them
+PROCESS_SETTINGS = ('EXCHANGE_RATE', 'DB_THREADS', 'TENANTS_FILE', 'WORKER_PROCESSES')
+
 class Config:
     BOT_TOKEN = os.getenv('BOT_TOKEN')
-    ADMIN_ID = int(os.getenv('ADMIN_ID'))
+    ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
+    DB_PATH = os.getenv('DB_PATH', 'store_bot.db')
     EXCHANGE_RATE = float(os.getenv('EXCHANGE_RATE', 1.16))
     
+    # Live quotes (units per 1 EUR) for usd/btc/eth/sol/ltc/usdt: 'static'
+    # uses EXCHANGE_RATE only, 'file' reads RATE_FILE (JSON), 'http' GETs
+    # the same JSON from RATE_URL. EXCHANGE_RATE stays the USD fallback.
+    RATE_PROVIDER = os.getenv('RATE_PROVIDER', 'static').lower()
+    RATE_FILE = os.getenv('RATE_FILE', 'rates.json')
+    RATE_URL = os.getenv('RATE_URL')
+    RATE_TIMEOUT = float(os.getenv('RATE_TIMEOUT', 5))
+    RATE_TTL = float(os.getenv('RATE_TTL', 60))
+    RATE_MAX_AGE = float(os.getenv('RATE_MAX_AGE', 900))
+    PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', 10))
+    
+    # Update delivery: 'polling' or 'webhook'
+    BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+    # Updates of different users run in parallel on this many workers;
+    # each user's own updates are still handled in order
+    UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 16))
+    
+    # Webhook mode: Telegram posts to WEBHOOK_URL/WEBHOOK_PATH, the embedded
+    # server listens on WEBHOOK_LISTEN:WEBHOOK_PORT (put TLS in front of it)
+    WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+    WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+    WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+    
+    # Seconds between writes of changed user_data / conversation states
+    PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', 5))
+    
+    # Abandoned checkout state is evicted from user_data after CHECKOUT_TTL
+    # seconds of inactivity, checked every SESSION_SWEEP_INTERVAL seconds
+    CHECKOUT_TTL = float(os.getenv('CHECKOUT_TTL', 3600))
+    SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', 300))
+    
+    # Cart rows untouched for CART_TTL seconds are purged in batches
+    CART_TTL = float(os.getenv('CART_TTL', 7 * 86400))
+    CART_PURGE_INTERVAL = float(os.getenv('CART_PURGE_INTERVAL', 3600))
+    CART_PURGE_BATCH = int(os.getenv('CART_PURGE_BATCH', 500))
+    
+    # Messages whose last rendered text/markup is remembered to skip no-op edits
+    RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 10000))
+    
+    # Worker mode: with WORKER_PROCESSES > 1 a supervisor receives updates
+    # (webhook or polling, per BOT_MODE) and routes each user's updates to
+    # one of that many worker processes sharing DB_PATH. Workers poll for
+    # cache changes made by the others every CACHE_SYNC_INTERVAL seconds.
+    WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', 1))
+    CACHE_SYNC_INTERVAL = float(os.getenv('CACHE_SYNC_INTERVAL', 1.0))
+    
+    # Multi-tenant mode: a JSON list of per-store settings (see
+    # tenants.example.json), all run in this process on one event loop.
+    # DB_THREADS is the size of the thread pool the tenants' databases share.
+    TENANTS_FILE = os.getenv('TENANTS_FILE')
+    DB_THREADS = int(os.getenv('DB_THREADS', 8))
+    
+    # Outbound message pacing (Telegram allows ~30 msg/s overall, ~1 msg/s per chat)
+    OUTBOX_RATE = float(os.getenv('OUTBOX_RATE', 25))
+    OUTBOX_CHAT_INTERVAL = float(os.getenv('OUTBOX_CHAT_INTERVAL', 1.0))
+    OUTBOX_MAX_RETRIES = int(os.getenv('OUTBOX_MAX_RETRIES', 5))
+    
     # States for conversations
     (
         PRODUCT_NAME, PRODUCT_PRICE, PRODUCT_DESCRIPTION, PRODUCT_QUANTITY,
@@ -15,8 +80,29 @@ class Config:
         PAYMENT_CURRENCY, PAYMENT_ADDRESS, PAYMENT_BLOCKCHAIN,
         DISCOUNT_CLIENT_TYPE, DISCOUNT_CLIENT_ID, DISCOUNT_CODE, 
         DISCOUNT_PERCENTAGE, DISCOUNT_EXPIRY, DISCOUNT_MAX_USES,
-        CONTENT_EDIT, PAYMENT_SOURCE_ADDRESS, DISCOUNT_CODE_INPUT
-    ) = range(20)
+        CONTENT_EDIT, PAYMENT_SOURCE_ADDRESS, DISCOUNT_CODE_INPUT,
+        SEARCH_QUERY
+    ) = range(21)
     
     # Add conversation end state
     CONVERSATION_END = -1
+    
+    @classmethod
+    def for_tenant(cls, settings):
+        # Keys are Config attribute names; anything not given keeps the
+        # process-wide value from the environment
+        config = cls()
+        for key, value in settings.items():
+            if key == 'name':
+                continue
+            if not key.isupper() or not hasattr(cls, key):
+                raise ValueError(f"Unknown tenant setting '{key}'")
+            if key.startswith('RATE_') or key in PROCESS_SETTINGS:
+                raise ValueError(f"'{key}' applies to every tenant and can only be set in the environment")
+            default = getattr(cls, key)
+            if isinstance(default, (bool, int, float)) and not isinstance(value, type(default)):
+                value = type(default)(value)
+            elif isinstance(default, str) and value is not None:
+                value = str(value).lower() if key == 'BOT_MODE' else str(value)
+            setattr(config, key, value)
+        return config
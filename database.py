@@ -1,141 +1,314 @@
+import asyncio
 import sqlite3
 import logging
-from datetime import datetime
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from migrations import apply_migrations
 
 logger = logging.getLogger(__name__)
 
+# Connection pool tuning
+POOL_SIZE = 5
+POOL_TIMEOUT = 30
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 16384
+
+# Columns of the single store_counters row, in statistics screen order
+COUNTER_COLUMNS = (
+    'total_products', 'active_products',
+    'total_orders', 'completed_orders', 'pending_orders',
+    'cart_items',
+    'total_codes', 'active_codes',
+)
+
+# Search input is reduced to at most this many word terms
+MAX_SEARCH_TERMS = 8
+
+def fts_match_query(text: str) -> str:
+    # Each term is quoted so user input can never inject FTS5 syntax, and
+    # suffixed with * so partially typed words still match.
+    terms = re.findall(r'\w+', text.lower())[:MAX_SEARCH_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
 class Database:
-    def __init__(self, db_path="store_bot.db"):
+    def __init__(self, db_path="store_bot.db", pool_size=POOL_SIZE, executor=None):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pool_lock = threading.Lock()
+        self._opened = 0
+        # Tenants in one process pass a shared executor so DB threads don't
+        # multiply with the number of stores; each keeps its own connections
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
         self.init_db()
 
-    def init_db(self):
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def _acquire(self):
         try:
-            conn = sqlite3.connect(self.db_path)
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._opened < self.pool_size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+
+        try:
+            return self._pool.get(timeout=POOL_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"No database connection available after {POOL_TIMEOUT}s")
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def _call(self, func, args):
+        with self.connection() as conn:
+            return func(conn, *args)
+
+    async def run(self, func, *args):
+        # Runs func(conn, *args) on a pooled connection in the DB thread pool
+        # so sqlite never blocks the event loop.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def execute(self, sql, params=()):
+        def _execute(conn):
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount
+        return await self.run(_execute)
+
+    async def fetch_product_page(self, columns, where, direction=None, anchor_id=None, page_size=10):
+        # Keyset pagination over products ordered by (name, id). The anchor is
+        # the id of the first/last row on the current page, so callback data
+        # stays short and every page is an index seek, not an OFFSET scan.
+        # Returns (rows, has_prev, has_next).
+        sql = f'SELECT {columns} FROM products WHERE {where}'
+
+        def _fetch(conn):
             cursor = conn.cursor()
-            
-            # Products table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    description TEXT,
-                    quantity INTEGER NOT NULL,
-                    image1 TEXT,
-                    image2 TEXT,
-                    coordinates TEXT,
-                    active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Content table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS content (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    key TEXT UNIQUE NOT NULL,
-                    value TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Payment settings table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS payment_settings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    currency_code TEXT UNIQUE NOT NULL,
-                    address TEXT NOT NULL,
-                    blockchain TEXT NOT NULL
-                )
-            ''')
-            
-            # Discount codes table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS discount_codes (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    code TEXT UNIQUE NOT NULL,
-                    discount_percentage REAL NOT NULL,
-                    expiry_date DATE,
-                    max_uses INTEGER DEFAULT -1,
-                    used_count INTEGER DEFAULT 0,
-                    is_general BOOLEAN DEFAULT TRUE,
-                    client_id INTEGER,
-                    client_username TEXT,
-                    active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Orders table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    user_name TEXT,
-                    product_id INTEGER,
-                    product_name TEXT,
-                    quantity INTEGER NOT NULL,
-                    total_price REAL NOT NULL,
-                    order_id TEXT UNIQUE NOT NULL,
-                    payment_currency TEXT,
-                    payment_source_address TEXT,
-                    discount_code TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Cart table
+
+            anchor = None
+            if direction in ('next', 'prev') and anchor_id is not None:
+                cursor.execute('SELECT name, id FROM products WHERE id = ?', (anchor_id,))
+                anchor = cursor.fetchone()
+
+            if anchor is not None and direction == 'next':
+                cursor.execute(f'{sql} AND (name, id) > (?, ?) ORDER BY name, id LIMIT ?', anchor + (page_size + 1,))
+                rows = cursor.fetchall()
+                if rows:
+                    return rows[:page_size], True, len(rows) > page_size
+
+            if anchor is not None and direction == 'prev':
+                cursor.execute(f'{sql} AND (name, id) < (?, ?) ORDER BY name DESC, id DESC LIMIT ?', anchor + (page_size + 1,))
+                rows = cursor.fetchall()
+                if rows:
+                    return rows[:page_size][::-1], len(rows) > page_size, True
+
+            # First page, or the anchor row/page disappeared since it was rendered
+            cursor.execute(f'{sql} ORDER BY name, id LIMIT ?', (page_size + 1,))
+            rows = cursor.fetchall()
+            return rows[:page_size], False, len(rows) > page_size
+
+        return await self.run(_fetch)
+
+    async def search_products(self, text, after=None, page_size=10):
+        # Products matching in the name come first, shortest name first (for
+        # a fixed query that is what bm25 on the name column comes down to),
+        # then products matching only in the description, by id. Scoring
+        # every match with bm25 cost 10-20 ms for broad terms on 50k rows;
+        # this only sorts the name matches and reads description matches in
+        # rowid order until the page is full.
+        # Pages are keyset on (tier, weight, id): `after` is the key of the
+        # last row of the previous page. Returns (rows, next_key) with
+        # next_key None on the last page.
+        match = fts_match_query(text)
+        if not match:
+            return [], None
+        name_match = f'{{name}} : ({match})'
+        tier, weight, last_id = after or (0, -1, 0)
+
+        def _search(conn):
+            rows = []
+            if tier == 0:
+                rows = conn.execute('''
+                    SELECT p.id, p.name, p.price, p.quantity, 0, length(p.name)
+                    FROM products p
+                    WHERE p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)
+                      AND p.active = TRUE AND p.quantity > 0
+                      AND (length(p.name), p.id) > (?, ?)
+                    ORDER BY length(p.name), p.id
+                    LIMIT ?
+                ''', (name_match, weight, last_id, page_size + 1)).fetchall()
+            if len(rows) <= page_size:
+                rows += conn.execute('''
+                    SELECT p.id, p.name, p.price, p.quantity, 1, 0
+                    FROM products_fts f
+                    JOIN products p ON p.id = f.rowid
+                    WHERE products_fts MATCH ? AND f.rowid > ?
+                      AND p.active = TRUE AND p.quantity > 0
+                    ORDER BY f.rowid
+                    LIMIT ?
+                ''', (f'({match}) NOT {name_match}', last_id if tier == 1 else 0, page_size + 1 - len(rows))).fetchall()
+            return rows
+
+        rows = await self.run(_search)
+        page = rows[:page_size]
+        next_key = None
+        if len(rows) > page_size:
+            product_id, _, _, _, row_tier, row_weight = page[-1]
+            next_key = (row_tier, row_weight, product_id)
+        return [row[:4] for row in page], next_key
+
+    async def purge_cart_batch(self, max_age_seconds, batch_size=500):
+        # Deletes at most batch_size cart rows older than max_age_seconds,
+        # oldest first, via idx_cart_added_at. Each call is one short write
+        # transaction. Returns the number of rows deleted.
+        return await self.execute('''
+            DELETE FROM cart WHERE id IN (
+                SELECT id FROM cart WHERE added_at < datetime('now', ?) ORDER BY added_at LIMIT ?
+            )
+        ''', (f'-{int(max_age_seconds)} seconds', batch_size))
+
+    async def read_counters(self):
+        row = await self.fetchone(f'SELECT {", ".join(COUNTER_COLUMNS)} FROM store_counters WHERE id = 1')
+        return dict(zip(COUNTER_COLUMNS, row))
+
+    async def rebuild_counters(self):
+        # Recomputes every counter in one aggregate pass per table and stores
+        # the result. Returns {column: (stored, actual)} for counters that
+        # had drifted; empty when the trigger-maintained values were exact.
+        def _rebuild(conn):
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'SELECT {", ".join(COUNTER_COLUMNS)} FROM store_counters WHERE id = 1')
+            stored = cursor.fetchone()
             cursor.execute('''
-                CREATE TABLE IF NOT EXISTS cart (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    product_id INTEGER NOT NULL,
-                    quantity INTEGER NOT NULL,
-                    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, product_id)
-                )
+                SELECT p.total, p.active, o.total, o.completed, o.pending, c.total, d.total, d.active
+                FROM (SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE active IS TRUE) AS active FROM products) p,
+                     (SELECT COUNT(*) AS total,
+                             COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                             COUNT(*) FILTER (WHERE status = 'pending') AS pending
+                      FROM orders) o,
+                     (SELECT COUNT(*) AS total FROM cart) c,
+                     (SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE active IS TRUE) AS active FROM discount_codes) d
             ''')
-            
-            # Insert default content
-            default_content = [
-                ('welcome_message', 'Hello! 👋 I am your store bot.\n\nChoose from the options below:'),
-                ('about_us', 'This is our store. We sell quality products with crypto payments.'),
-                ('contact', 'Contact us: @admin'),
-                ('website', 'https://example.com'),
-                ('rules', 'Store rules:\n1. Be respectful\n2. No refunds'),
-                ('faq', 'Frequently Asked Questions:\nQ: How to pay?\nA: Use crypto payments.'),
-                ('success_message', 'Thank you for your purchase! Admin will contact you soon.')
-            ]
-            
-            cursor.executemany(
-                'INSERT OR IGNORE INTO content (key, value) VALUES (?, ?)',
-                default_content
-            )
-            
-            # Insert default payment methods
-            default_payments = [
-                ('btc', '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Bitcoin'),
-                ('eth', '0x742d35Cc6634C0532925a3b8D4B3b8a3b8d4b3b8', 'Ethereum'),
-                ('sol', 'So1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Solana'),
-                ('ltc', 'Lc1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Litecoin'),
-                ('usdt', '0x842d35Cc6634C0532925a3b8D4B3b8a3b8d4b3b8', 'Ethereum')
-            ]
-            
-            cursor.executemany(
-                'INSERT OR IGNORE INTO payment_settings (currency_code, address, blockchain) VALUES (?, ?, ?)',
-                default_payments
+            actual = cursor.fetchone()
+            cursor.execute(
+                f'UPDATE store_counters SET {", ".join(f"{c} = ?" for c in COUNTER_COLUMNS)} WHERE id = 1',
+                actual
             )
-            
             conn.commit()
-            conn.close()
-            logger.info("Database initialized successfully")
-        except Exception as e:
-            logger.error(f"Error initializing database: {e}")
+            return {
+                column: (old, new)
+                for column, old, new in zip(COUNTER_COLUMNS, stored, actual)
+                if old != new
+            }
+
+        return await self.run(_rebuild)
+
+    def stats(self):
+        # threads is None for a shared executor that does not expose its size
+        threads = self.pool_size if self._owns_executor else getattr(self._executor, '_max_workers', None)
+        return {
+            'threads': threads,
+            'shared_executor': not self._owns_executor,
+            'connections': self._opened,
+            'pool_size': self.pool_size,
+        }
+
+    def close(self):
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+        with self._pool_lock:
+            while True:
+                try:
+                    conn = self._pool.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._opened -= 1
+
+    def init_db(self):
+        # A failed migration is rolled back and aborts startup; running on
+        # the old schema would only fail later, one query at a time
+        with self.connection() as conn:
+            apply_migrations(conn)
+            try:
+                self._seed_defaults(conn)
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error seeding default data: {e}")
+        logger.info("Database initialized successfully")
+
+    def _seed_defaults(self, conn):
+        cursor = conn.cursor()
+
+        # Insert default content
+        default_content = [
+            ('welcome_message', 'Hello! 👋 I am your store bot.\n\nChoose from the options below:'),
+            ('about_us', 'This is our store. We sell quality products with crypto payments.'),
+            ('contact', 'Contact us: @admin'),
+            ('website', 'https://example.com'),
+            ('rules', 'Store rules:\n1. Be respectful\n2. No refunds'),
+            ('faq', 'Frequently Asked Questions:\nQ: How to pay?\nA: Use crypto payments.'),
+            ('success_message', 'Thank you for your purchase! Admin will contact you soon.')
+        ]
+
+        cursor.executemany(
+            'INSERT OR IGNORE INTO content (key, value) VALUES (?, ?)',
+            default_content
+        )
+
+        # Insert default payment methods
+        default_payments = [
+            ('btc', '1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Bitcoin'),
+            ('eth', '0x742d35Cc6634C0532925a3b8D4B3b8a3b8d4b3b8', 'Ethereum'),
+            ('sol', 'So1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Solana'),
+            ('ltc', 'Lc1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa', 'Litecoin'),
+            ('usdt', '0x842d35Cc6634C0532925a3b8D4B3b8a3b8d4b3b8', 'Ethereum')
+        ]
 
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        cursor.executemany(
+            'INSERT OR IGNORE INTO payment_settings (currency_code, address, blockchain) VALUES (?, ?, ?)',
+            default_payments
+        )
 
-# Create global database instance
-db = Database()
+        conn.commit()
@@ -0,0 +1,160 @@
+import csv
+import io
+import logging
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ('name', 'price', 'description', 'quantity', 'coordinates', 'image1', 'image2', 'active')
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'off')
+MAX_IMPORT_ROWS = 50000
+
+class ImportFileError(Exception):
+    pass
+
+def read_rows(data: bytes, filename: str):
+    # Returns (header, rows) with every cell as a stripped string
+    if filename.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise ImportFileError("XLSX import needs openpyxl installed, upload a CSV file instead")
+        workbook = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+        try:
+            sheet_rows = [
+                ['' if cell is None else str(cell).strip() for cell in row]
+                for row in workbook.active.iter_rows(values_only=True)
+            ]
+        finally:
+            workbook.close()
+    else:
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ImportFileError("File is not valid UTF-8 text")
+        try:
+            dialect = csv.Sniffer().sniff(text[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        sheet_rows = [[cell.strip() for cell in row] for row in csv.reader(io.StringIO(text), dialect)]
+    
+    if not sheet_rows:
+        raise ImportFileError("File is empty")
+    
+    header = [cell.lower() for cell in sheet_rows[0]]
+    unknown = [column for column in header if column and column not in IMPORT_COLUMNS]
+    if unknown:
+        raise ImportFileError(f"Unknown columns: {', '.join(unknown)}. Allowed: {', '.join(IMPORT_COLUMNS)}")
+    if 'name' not in header:
+        raise ImportFileError("Missing required column: name")
+    if len(sheet_rows) - 1 > MAX_IMPORT_ROWS:
+        raise ImportFileError(f"Too many rows, the limit is {MAX_IMPORT_ROWS}")
+    
+    return header, sheet_rows[1:]
+
+def _validate(record):
+    # Converts one row in place; empty cells become None ("leave unchanged")
+    if not record['name']:
+        raise ValueError("name is empty")
+    
+    if record['price'] is not None:
+        try:
+            record['price'] = float(record['price'].replace(',', '.'))
+        except ValueError:
+            raise ValueError(f"invalid price '{record['price']}'")
+        if record['price'] <= 0:
+            raise ValueError("price must be positive")
+    
+    if record['quantity'] is not None:
+        try:
+            record['quantity'] = int(record['quantity'])
+        except ValueError:
+            raise ValueError(f"invalid quantity '{record['quantity']}'")
+        if record['quantity'] < 0:
+            raise ValueError("quantity cannot be negative")
+    
+    if record['coordinates'] is not None:
+        try:
+            lat, lon = map(float, record['coordinates'].split(','))
+        except ValueError:
+            raise ValueError(f"invalid coordinates '{record['coordinates']}', use 59.4370, 24.7536")
+    
+    if record['active'] is not None:
+        value = record['active'].lower()
+        if value in TRUE_VALUES:
+            record['active'] = True
+        elif value in FALSE_VALUES:
+            record['active'] = False
+        else:
+            raise ValueError(f"invalid active '{record['active']}', use yes or no")
+
+def import_products(conn, header, rows):
+    # Upserts products by exact name in a single transaction. Returns
+    # (inserted, updated, errors) where errors is [(row_number, message)]
+    # using spreadsheet row numbers (header is row 1).
+    cursor = conn.cursor()
+    
+    # Take the write lock before reading names so a concurrent add cannot
+    # slip in between and turn an update into a duplicate insert
+    cursor.execute('BEGIN IMMEDIATE')
+    existing = dict(cursor.execute('SELECT name, MIN(id) FROM products GROUP BY name').fetchall())
+    
+    errors = []
+    seen = {}
+    updates = []
+    inserts = []
+    for row_number, row in enumerate(rows, start=2):
+        if not any(row):
+            continue
+        
+        record = dict.fromkeys(IMPORT_COLUMNS)
+        for column, value in zip(header, row):
+            if column:
+                record[column] = value or None
+        
+        try:
+            _validate(record)
+            if record['name'] in seen:
+                raise ValueError(f"duplicate name, already on row {seen[record['name']]}")
+            product_id = existing.get(record['name'])
+            if product_id is None and record['price'] is None:
+                raise ValueError("price is required for new products")
+        except ValueError as e:
+            errors.append((row_number, str(e)))
+            continue
+        seen[record['name']] = row_number
+        
+        if product_id is None:
+            inserts.append((
+                record['name'], record['price'], record['description'],
+                record['quantity'] or 0, record['image1'], record['image2'], record['coordinates'],
+                True if record['active'] is None else record['active']
+            ))
+        else:
+            updates.append((
+                record['price'], record['description'], record['quantity'], record['image1'],
+                record['image2'], record['coordinates'], record['active'], product_id
+            ))
+    
+    cursor.executemany('''
+        UPDATE products SET
+            price = COALESCE(?, price),
+            description = COALESCE(?, description),
+            quantity = COALESCE(?, quantity),
+            image1 = COALESCE(?, image1),
+            image2 = COALESCE(?, image2),
+            coordinates = COALESCE(?, coordinates),
+            active = COALESCE(?, active)
+        WHERE id = ?
+    ''', updates)
+    cursor.executemany('''
+        INSERT INTO products (name, price, description, quantity, image1, image2, coordinates, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', inserts)
+    conn.commit()
+    
+    logger.info(f"Product import: {len(inserts)} inserted, {len(updates)} updated, {len(errors)} rejected")
+    return len(inserts), len(updates), errors
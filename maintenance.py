@@ -0,0 +1,56 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CartPurger:
+    # Periodically deletes cart rows untouched for longer than `ttl` seconds.
+    # Work is split into batches of `batch_size` rows, each its own short
+    # transaction, with a pause in between so other writers get the lock.
+    def __init__(self, database, ttl: float = 7 * 86400, interval: float = 3600, batch_size: int = 500, pause: float = 0.05):
+        self.database = database
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._task = None
+        self.reclaimed = 0
+        self.last_reclaimed = 0
+    
+    async def start(self, application=None):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self, application=None):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.purge()
+            except Exception as e:
+                logger.error(f"Cart purge failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def purge(self):
+        total = 0
+        while True:
+            deleted = await self.database.purge_cart_batch(self.ttl, self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+            await asyncio.sleep(self.pause)
+        
+        self.reclaimed += total
+        self.last_reclaimed = total
+        if total:
+            logger.info(f"Cart purge reclaimed {total} expired rows")
+        return total
+    
+    def stats(self):
+        return {
+            'reclaimed': self.reclaimed,
+            'last_reclaimed': self.last_reclaimed,
+        }
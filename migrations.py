@@ -0,0 +1,461 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Each migration is (version, description, function). Migrations run in
+# order inside their own transaction and are recorded in schema_version,
+# so existing database files are upgraded in place on startup. Never edit
+# a released migration - append a new one instead.
+
+def _initial_schema(cursor):
+    # Matches the schema created before versioning existed, hence IF NOT
+    # EXISTS: pre-versioning databases adopt it as version 1 unchanged.
+    
+    # Products table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            description TEXT,
+            quantity INTEGER NOT NULL,
+            image1 TEXT,
+            image2 TEXT,
+            coordinates TEXT,
+            active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Content table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS content (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE NOT NULL,
+            value TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Payment settings table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payment_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            currency_code TEXT UNIQUE NOT NULL,
+            address TEXT NOT NULL,
+            blockchain TEXT NOT NULL
+        )
+    ''')
+    
+    # Discount codes table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discount_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            discount_percentage REAL NOT NULL,
+            expiry_date DATE,
+            max_uses INTEGER DEFAULT -1,
+            used_count INTEGER DEFAULT 0,
+            is_general BOOLEAN DEFAULT TRUE,
+            client_id INTEGER,
+            client_username TEXT,
+            active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Orders table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_name TEXT,
+            product_id INTEGER,
+            product_name TEXT,
+            quantity INTEGER NOT NULL,
+            total_price REAL NOT NULL,
+            order_id TEXT UNIQUE NOT NULL,
+            payment_currency TEXT,
+            payment_source_address TEXT,
+            discount_code TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Cart table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cart (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, product_id)
+        )
+    ''')
+
+def _hot_path_indexes(cursor):
+    # orders.order_id, cart (user_id, product_id) and discount_codes.code
+    # are already covered by the implicit indexes of their UNIQUE constraints.
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)')
+    
+    # Admin product list: ORDER BY name
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name, id)')
+    
+    # Client catalog: WHERE active = TRUE AND quantity > 0 ORDER BY name
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_products_in_stock ON products (name, id)
+        WHERE active = TRUE AND quantity > 0
+    ''')
+
+def _normalize_orders(cursor):
+    # One header per order keyed by order_id, plus one row per purchased
+    # product. Replaces the old layout that repeated the order columns
+    # on every item row.
+    cursor.execute('''
+        CREATE TABLE orders_new (
+            order_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            user_name TEXT,
+            total_price REAL NOT NULL,
+            payment_currency TEXT,
+            payment_source_address TEXT,
+            discount_code TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL REFERENCES orders (order_id) ON DELETE CASCADE,
+            product_id INTEGER,
+            product_name TEXT,
+            price REAL,
+            quantity INTEGER NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        INSERT INTO orders_new
+        (order_id, user_id, user_name, total_price, payment_currency, payment_source_address, discount_code, status, created_at)
+        SELECT order_id, user_id, user_name, total_price, payment_currency, payment_source_address, discount_code, status, created_at
+        FROM orders
+        WHERE id IN (SELECT MIN(id) FROM orders GROUP BY order_id)
+    ''')
+    
+    # Legacy rows never stored the unit price; fall back to the current one.
+    cursor.execute('''
+        INSERT INTO order_items (order_id, product_id, product_name, price, quantity)
+        SELECT o.order_id, o.product_id, o.product_name, p.price, o.quantity
+        FROM orders o
+        LEFT JOIN products p ON p.id = o.product_id
+        ORDER BY o.id
+    ''')
+    
+    cursor.execute('DROP TABLE orders')
+    cursor.execute('ALTER TABLE orders_new RENAME TO orders')
+    
+    cursor.execute('CREATE INDEX idx_orders_status ON orders (status)')
+    cursor.execute('CREATE INDEX idx_order_items_order ON order_items (order_id)')
+
+def _product_search_index(cursor):
+    # External-content FTS5 index over products, kept in sync by triggers.
+    # prefix='2 3' pre-indexes short prefixes so "term*" queries stay fast.
+    cursor.execute('''
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        END
+    ''')
+    # Only text changes touch the index; stock and price updates skip it
+    cursor.execute('''
+        CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO products_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+    ''')
+    
+    cursor.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+def _store_counters(cursor):
+    # Single-row table of the statistics screen counters, maintained by
+    # triggers so reading them never scans the underlying tables.
+    cursor.execute('''
+        CREATE TABLE store_counters (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_products INTEGER NOT NULL DEFAULT 0,
+            active_products INTEGER NOT NULL DEFAULT 0,
+            total_orders INTEGER NOT NULL DEFAULT 0,
+            completed_orders INTEGER NOT NULL DEFAULT 0,
+            pending_orders INTEGER NOT NULL DEFAULT 0,
+            cart_items INTEGER NOT NULL DEFAULT 0,
+            total_codes INTEGER NOT NULL DEFAULT 0,
+            active_codes INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO store_counters
+        SELECT 1, p.total, p.active, o.total, o.completed, o.pending, c.total, d.total, d.active
+        FROM (SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE active IS TRUE) AS active FROM products) p,
+             (SELECT COUNT(*) AS total,
+                     COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                     COUNT(*) FILTER (WHERE status = 'pending') AS pending
+              FROM orders) o,
+             (SELECT COUNT(*) AS total FROM cart) c,
+             (SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE active IS TRUE) AS active FROM discount_codes) d
+    ''')
+    
+    triggers = {
+        'products': (
+            'total_products = total_products + 1, active_products = active_products + (new.active IS TRUE)',
+            'total_products = total_products - 1, active_products = active_products - (old.active IS TRUE)',
+            'active', 'active_products = active_products + (new.active IS TRUE) - (old.active IS TRUE)',
+        ),
+        'orders': (
+            '''total_orders = total_orders + 1,
+               completed_orders = completed_orders + (new.status IS 'completed'),
+               pending_orders = pending_orders + (new.status IS 'pending')''',
+            '''total_orders = total_orders - 1,
+               completed_orders = completed_orders - (old.status IS 'completed'),
+               pending_orders = pending_orders - (old.status IS 'pending')''',
+            'status', '''completed_orders = completed_orders + (new.status IS 'completed') - (old.status IS 'completed'),
+               pending_orders = pending_orders + (new.status IS 'pending') - (old.status IS 'pending')''',
+        ),
+        'cart': (
+            'cart_items = cart_items + 1',
+            'cart_items = cart_items - 1',
+            None, None,
+        ),
+        'discount_codes': (
+            'total_codes = total_codes + 1, active_codes = active_codes + (new.active IS TRUE)',
+            'total_codes = total_codes - 1, active_codes = active_codes - (old.active IS TRUE)',
+            'active', 'active_codes = active_codes + (new.active IS TRUE) - (old.active IS TRUE)',
+        ),
+    }
+    
+    for table, (on_insert, on_delete, column, on_update) in triggers.items():
+        cursor.execute(f'''
+            CREATE TRIGGER {table}_counters_insert AFTER INSERT ON {table} BEGIN
+                UPDATE store_counters SET {on_insert} WHERE id = 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER {table}_counters_delete AFTER DELETE ON {table} BEGIN
+                UPDATE store_counters SET {on_delete} WHERE id = 1;
+            END
+        ''')
+        if column:
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_counters_update AFTER UPDATE OF {column} ON {table} BEGIN
+                    UPDATE store_counters SET {on_update} WHERE id = 1;
+                END
+            ''')
+
+def _sales_rollups(cursor):
+    # Completed-order totals per day/currency, product and discount code,
+    # updated incrementally by analytics.record_sale().
+    cursor.execute('''
+        CREATE TABLE sales_daily (
+            day TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            units INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, currency)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE sales_by_product (
+            product_id INTEGER PRIMARY KEY,
+            product_name TEXT,
+            units INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE sales_by_discount (
+            code TEXT PRIMARY KEY,
+            orders INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    # Backfill from orders completed before the rollups existed
+    cursor.execute('''
+        INSERT INTO sales_daily (day, currency, orders, units, revenue)
+        SELECT date(o.created_at), COALESCE(o.payment_currency, ''), COUNT(*),
+               COALESCE(SUM((SELECT SUM(quantity) FROM order_items i WHERE i.order_id = o.order_id)), 0),
+               SUM(o.total_price)
+        FROM orders o
+        WHERE o.status = 'completed'
+        GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_by_product (product_id, product_name, units, revenue)
+        SELECT i.product_id, MAX(i.product_name), SUM(i.quantity), SUM(COALESCE(i.price, 0) * i.quantity)
+        FROM order_items i
+        JOIN orders o ON o.order_id = i.order_id
+        WHERE o.status = 'completed' AND i.product_id IS NOT NULL
+        GROUP BY i.product_id
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_by_discount (code, orders, revenue)
+        SELECT discount_code, COUNT(*), SUM(total_price)
+        FROM orders
+        WHERE status = 'completed' AND discount_code IS NOT NULL
+        GROUP BY discount_code
+    ''')
+
+def _orders_created_at_index(cursor):
+    # Date-range filters and ordering for the orders export
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)')
+
+def _persistence(cursor):
+    # Pickled user_data/chat_data/bot_data and conversation states for
+    # persistence.SQLitePersistence, one row per entry
+    cursor.execute('''
+        CREATE TABLE persistence (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID
+    ''')
+
+def _cart_added_at_index(cursor):
+    # Range scans for the expired cart purge
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cart_added_at ON cart(added_at)')
+
+def _cache_versions(cursor):
+    # One counter per in-memory cache, bumped by triggers on every write to
+    # the table behind it, so worker processes sharing the database can
+    # tell when their copies went stale (cache.CacheSync)
+    cursor.execute('''
+        CREATE TABLE cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    for name, table in (('catalog', 'products'), ('content', 'content')):
+        cursor.execute('INSERT INTO cache_versions (name) VALUES (?)', (name,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER {table}_cache_version_{event.lower()} AFTER {event} ON {table} BEGIN
+                    UPDATE cache_versions SET version = version + 1 WHERE name = '{name}';
+                END
+            ''')
+
+def _sales_rollups_by_day(cursor):
+    # Product and discount rollups get a day column like sales_daily, so
+    # the sales report can sum them over the same window. Rebuilt from
+    # orders, which also drops anything a reversal left at zero.
+    cursor.execute('DROP TABLE sales_by_product')
+    cursor.execute('DROP TABLE sales_by_discount')
+    cursor.execute('''
+        CREATE TABLE sales_by_product (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name TEXT,
+            units INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE sales_by_discount (
+            day TEXT NOT NULL,
+            code TEXT NOT NULL,
+            orders INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, code)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        INSERT INTO sales_by_product (day, product_id, product_name, units, revenue)
+        SELECT date(o.created_at), i.product_id, MAX(i.product_name), SUM(i.quantity),
+               SUM(COALESCE(i.price, 0) * i.quantity)
+        FROM order_items i
+        JOIN orders o ON o.order_id = i.order_id
+        WHERE o.status = 'completed' AND i.product_id IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_by_discount (day, code, orders, revenue)
+        SELECT date(created_at), discount_code, COUNT(*), SUM(total_price)
+        FROM orders
+        WHERE status = 'completed' AND discount_code IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "hot path indexes", _hot_path_indexes),
+    (3, "normalize orders into headers and order_items", _normalize_orders),
+    (4, "full-text product search", _product_search_index),
+    (5, "store counters", _store_counters),
+    (6, "sales rollups", _sales_rollups),
+    (7, "orders created_at index", _orders_created_at_index),
+    (8, "bot persistence", _persistence),
+    (9, "cart added_at index", _cart_added_at_index),
+    (10, "cache versions", _cache_versions),
+    (11, "sales rollups by day", _sales_rollups_by_day),
+]
+
+def get_schema_version(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    return cursor.fetchone()[0]
+
+def apply_migrations(conn):
+    current = get_schema_version(conn)
+    
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        # BEGIN IMMEDIATE takes the write lock up front so that concurrent
+        # processes starting at the same time apply each migration once.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            
+            logger.info(f"Applying migration {version}: {description}")
+            migrate(conn.cursor())
+            conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return get_schema_version(conn)
@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import logging
+import time
+from datetime import timedelta
+from telegram.error import RetryAfter, NetworkError, TimedOut, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Lower value is sent first
+DELIVERY = 0
+NOTIFICATION = 10
+
+MAX_BACKOFF = 60
+MAX_MESSAGE_LENGTH = 4096
+MEDIA_GROUP_SIZE = 10
+
+def split_message(header: str, blocks, limit: int = MAX_MESSAGE_LENGTH):
+    # Joins header and blocks with blank lines into as few messages as fit
+    # Telegram's length limit, never splitting a block
+    messages = []
+    current = header
+    for block in blocks:
+        if len(current) + 2 + len(block) > limit:
+            messages.append(current)
+            current = block
+        else:
+            current += "\n\n" + block
+    messages.append(current)
+    return messages
+
+class Outbox:
+    # Central queue for outbound Telegram calls. Handlers enqueue and return;
+    # one dispatcher paces sends to `rate` per second overall and one per
+    # `chat_interval` seconds per chat, keeps per-chat order, and retries
+    # RetryAfter / network errors with backoff. `chat_intervals` overrides
+    # the per-chat interval for single chats.
+    def __init__(self, rate: float = 25, chat_interval: float = 1.0, max_retries: int = 5, chat_intervals=None):
+        self.rate = rate
+        self.chat_interval = chat_interval
+        self.chat_intervals = chat_intervals or {}
+        self.max_retries = max_retries
+        self.bot = None
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._chat_locks = {}
+        self._chat_jobs = {}
+        self._chat_next = {}
+        self._paused_until = 0.0
+        self._dispatcher = None
+        self._inflight = set()
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+    
+    def enqueue(self, method: str, chat_id: int, priority: int = NOTIFICATION, **kwargs):
+        self._queue.put_nowait((priority, next(self._seq), method, chat_id, kwargs))
+    
+    def send_message(self, chat_id: int, text: str, priority: int = NOTIFICATION, **kwargs):
+        self.enqueue('send_message', chat_id, priority, text=text, **kwargs)
+    
+    def send_photo(self, chat_id: int, photo, priority: int = NOTIFICATION, **kwargs):
+        self.enqueue('send_photo', chat_id, priority, photo=photo, **kwargs)
+    
+    def send_media_group(self, chat_id: int, media, priority: int = NOTIFICATION, **kwargs):
+        self.enqueue('send_media_group', chat_id, priority, media=media, **kwargs)
+    
+    async def start(self, application):
+        # post_init hook
+        self.bot = application.bot
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+            logger.info("Outbox started")
+    
+    async def stop(self, application=None, timeout: float = 10):
+        # post_stop hook: give queued sends a chance to go out, then cancel
+        if self._dispatcher is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Outbox stopped with {self._queue.qsize()} unsent messages")
+        self._dispatcher.cancel()
+        for task in list(self._inflight):
+            task.cancel()
+        self._dispatcher = None
+        logger.info("Outbox stopped")
+    
+    def stats(self):
+        return {
+            'pending': self._queue.qsize() + len(self._inflight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+        }
+    
+    async def _dispatch(self):
+        interval = 1 / self.rate
+        next_slot = time.monotonic()
+        while True:
+            job = await self._queue.get()
+            
+            now = time.monotonic()
+            next_slot = max(next_slot, now, self._paused_until)
+            if next_slot > now:
+                await asyncio.sleep(next_slot - now)
+            next_slot += interval
+            
+            if len(self._chat_next) > 10000:
+                self._prune(now)
+            
+            # Each job waits for its own chat in a separate task so a busy
+            # chat never holds up the others
+            chat_id = job[3]
+            self._chat_jobs[chat_id] = self._chat_jobs.get(chat_id, 0) + 1
+            task = asyncio.create_task(self._deliver(*job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+    
+    async def _deliver(self, priority, seq, method, chat_id, kwargs):
+        # asyncio.Lock wakes waiters in FIFO order, which keeps the
+        # message-then-photos order of a delivery intact
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        try:
+            async with lock:
+                for attempt in range(self.max_retries + 1):
+                    now = time.monotonic()
+                    wait = max(self._chat_next.get(chat_id, 0), self._paused_until) - now
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    
+                    try:
+                        await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+                        self.sent += 1
+                        return
+                    except RetryAfter as e:
+                        # Flood control is per bot, so pause every chat
+                        delay = e.retry_after
+                        if isinstance(delay, timedelta):
+                            delay = delay.total_seconds()
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                        logger.warning(f"Flood limit hit, pausing outbox for {delay}s")
+                    except (TimedOut, NetworkError) as e:
+                        self._chat_next[chat_id] = time.monotonic() + min(2 ** attempt, MAX_BACKOFF)
+                        logger.warning(f"{method} to {chat_id} failed ({e}), retrying")
+                    except TelegramError as e:
+                        # Blocked bot, bad file id etc. - retrying will not help
+                        logger.error(f"{method} to {chat_id} dropped: {e}")
+                        self.failed += 1
+                        return
+                    finally:
+                        chat_interval = self.chat_intervals.get(chat_id, self.chat_interval)
+                        self._chat_next[chat_id] = max(self._chat_next.get(chat_id, 0), time.monotonic() + chat_interval)
+                    self.retries += 1
+                
+                logger.error(f"{method} to {chat_id} dropped after {self.max_retries} retries")
+                self.failed += 1
+        finally:
+            self._chat_jobs[chat_id] -= 1
+            if not self._chat_jobs[chat_id]:
+                del self._chat_jobs[chat_id]
+                del self._chat_locks[chat_id]
+            self._queue.task_done()
+    
+    def _prune(self, now):
+        # Forget pacing state of idle chats whose interval has passed
+        for chat_id, next_time in list(self._chat_next.items()):
+            if next_time < now and chat_id not in self._chat_jobs:
+                del self._chat_next[chat_id]
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import pickle
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+FLUSH_DELAY = 0.1
+
+class SQLitePersistence(BasePersistence):
+    # Stores user_data, chat_data, bot_data and conversation states as one
+    # pickled row per entry in the persistence table. PTB only hands over
+    # entries that changed since its last run (every update_interval
+    # seconds); they are buffered and written together in one transaction
+    # shortly after, so flush cost follows the number of changed entries,
+    # not the number of users.
+    #
+    # With shard=(index, count) this is one of several worker processes
+    # (workers.py): it loads only the users routed to it (user_id % count ==
+    # index) and only worker 0 keeps bot_data, so no two processes ever
+    # write the same row.
+    def __init__(self, database, update_interval: float = 60, shard=None):
+        store_data = PersistenceInput(bot_data=shard is None or shard[0] == 0, callback_data=False)
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.database = database
+        self.shard = shard
+        self._pending = {}
+        self._flush_task = None
+        self.flushes = 0
+        self.rows_written = 0
+    
+    def _load(self, conn, kind):
+        rows = {}
+        for key, data in conn.execute('SELECT key, data FROM persistence WHERE kind = ?', (kind,)):
+            try:
+                rows[key] = pickle.loads(data)
+            except Exception as e:
+                logger.error(f"Skipping unreadable {kind} persistence entry {key}: {e}")
+        return rows
+    
+    def _owns(self, user_id):
+        return self.shard is None or user_id % self.shard[1] == self.shard[0]
+    
+    def _stage(self, kind, key, value):
+        # value None deletes the entry
+        self._pending[(kind, str(key))] = None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+    
+    async def _delayed_flush(self):
+        # PTB submits all changes of one persistence run together; waiting a
+        # moment lets them land in the same transaction
+        await asyncio.sleep(FLUSH_DELAY)
+        await self._write()
+    
+    async def _write(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        upserts = [(kind, key, data) for (kind, key), data in pending.items() if data is not None]
+        deletes = [(kind, key) for (kind, key), data in pending.items() if data is None]
+        
+        def _flush(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO persistence (kind, key, data, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (kind, key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            ''', upserts)
+            cursor.executemany('DELETE FROM persistence WHERE kind = ? AND key = ?', deletes)
+            conn.commit()
+        
+        try:
+            await self.database.run(_flush)
+        except Exception:
+            # Put the batch back unless newer values arrived meanwhile
+            for entry, data in pending.items():
+                self._pending.setdefault(entry, data)
+            raise
+        self.flushes += 1
+        self.rows_written += len(pending)
+    
+    async def get_user_data(self):
+        rows = await self.database.run(self._load, 'user')
+        return {int(key): value for key, value in rows.items() if self._owns(int(key))}
+    
+    async def get_chat_data(self):
+        # Private chat ids equal user ids, so they follow the same routing
+        rows = await self.database.run(self._load, 'chat')
+        return {int(key): value for key, value in rows.items() if self._owns(int(key))}
+    
+    async def get_bot_data(self):
+        rows = await self.database.run(self._load, 'bot')
+        return rows.get('bot', {})
+    
+    async def get_callback_data(self):
+        return None
+    
+    async def get_conversations(self, name):
+        rows = await self.database.run(self._load, f'conversation:{name}')
+        # Keys are (chat_id, user_id) for per_chat/per_user conversations
+        conversations = {tuple(json.loads(key)): state for key, state in rows.items()}
+        return {key: state for key, state in conversations.items() if self._owns(key[-1])}
+    
+    async def update_user_data(self, user_id, data):
+        self._stage('user', user_id, data)
+    
+    async def update_chat_data(self, chat_id, data):
+        self._stage('chat', chat_id, data)
+    
+    async def update_bot_data(self, data):
+        self._stage('bot', 'bot', data)
+    
+    async def update_callback_data(self, data):
+        pass
+    
+    async def update_conversation(self, name, key, new_state):
+        self._stage(f'conversation:{name}', json.dumps(list(key)), new_state)
+    
+    async def drop_user_data(self, user_id):
+        self._stage('user', user_id, None)
+    
+    async def drop_chat_data(self, chat_id):
+        self._stage('chat', chat_id, None)
+    
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+    
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+    
+    async def refresh_bot_data(self, bot_data):
+        pass
+    
+    async def flush(self):
+        # Called by PTB on shutdown after its final persistence run
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._write()
+        logger.info(f"Persistence flushed ({self.flushes} batches, {self.rows_written} rows written)")
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    # Runs updates from different users concurrently on up to `workers` at a
+    # time, while updates from the same user run one by one in arrival
+    # order, which conversations and the cart logic depend on.
+    #
+    # PTB's own semaphore (max_pending) only caps how many updates may be in
+    # flight in total; the worker limit is taken after the per-user lock so
+    # one user's backlog waits on its lock without occupying workers.
+    def __init__(self, workers: int = 16, max_pending: int = 1024):
+        super().__init__(max(max_pending, workers))
+        self.workers = workers
+        self._worker_slots = asyncio.Semaphore(workers)
+        self._user_locks = {}
+        self._user_pending = {}
+        self.running = 0
+        self.processed = 0
+        self.max_depth = 0
+        self.max_wait = 0.0
+    
+    @staticmethod
+    def _key(update):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+    
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        if key is None:
+            async with self._worker_slots:
+                await self._run(coroutine, time.monotonic())
+            return
+        
+        queued_at = time.monotonic()
+        lock = self._user_locks.setdefault(key, asyncio.Lock())
+        self._user_pending[key] = self._user_pending.get(key, 0) + 1
+        self.max_depth = max(self.max_depth, self._user_pending[key])
+        try:
+            async with lock:
+                async with self._worker_slots:
+                    await self._run(coroutine, queued_at)
+        finally:
+            self._user_pending[key] -= 1
+            if not self._user_pending[key]:
+                del self._user_pending[key]
+                del self._user_locks[key]
+    
+    async def _run(self, coroutine, queued_at):
+        self.max_wait = max(self.max_wait, time.monotonic() - queued_at)
+        self.running += 1
+        try:
+            await coroutine
+        finally:
+            self.running -= 1
+            self.processed += 1
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    def stats(self):
+        in_flight = self.current_concurrent_updates
+        return {
+            'workers': self.workers,
+            'running': self.running,
+            'queued': in_flight - self.running,
+            'active_users': len(self._user_pending),
+            'processed': self.processed,
+            'max_user_depth': self.max_depth,
+            'max_wait': self.max_wait,
+        }
@@ -0,0 +1,182 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+import time
+import httpx
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Rates are quoted as units of the currency per 1 EUR, e.g. {"usd": 1.16, "btc": 0.0000105}
+QUOTE_CURRENCIES = ('usd', 'btc', 'eth', 'sol', 'ltc', 'usdt')
+
+# Decimal places shown for an amount in each currency
+CURRENCY_DECIMALS = {'usd': 2, 'btc': 8, 'eth': 6, 'sol': 4, 'ltc': 6, 'usdt': 2}
+
+def parse_rates(data):
+    # Keeps the known currencies with a positive numeric rate, drops the rest
+    rates = {}
+    for code, value in data.items():
+        code = code.lower()
+        if code not in QUOTE_CURRENCIES:
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            rates[code] = value
+    return rates
+
+class RateProvider(ABC):
+    name = 'base'
+    
+    @abstractmethod
+    async def fetch(self):
+        ...
+
+class StaticRateProvider(RateProvider):
+    # Fixed rates; the default keeps the old EXCHANGE_RATE behaviour
+    name = 'static'
+    
+    def __init__(self, rates):
+        self.rates = parse_rates(rates)
+    
+    async def fetch(self):
+        return dict(self.rates)
+
+class FileRateProvider(RateProvider):
+    # A local JSON file of rates, re-read on every refresh
+    name = 'file'
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+    
+    async def fetch(self):
+        return parse_rates(await asyncio.to_thread(self._read))
+
+class HttpRateProvider(RateProvider):
+    # GETs a JSON object of rates from any endpoint that serves the format above
+    name = 'http'
+    
+    def __init__(self, url, timeout: float = 5):
+        self.url = url
+        self.timeout = timeout
+    
+    async def fetch(self):
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            return parse_rates(response.json())
+
+class RateCache:
+    # Serves quotes from memory only. Once started, a background loop
+    # refreshes them every `ttl` seconds. A quote found older than `ttl` is
+    # still returned while a single extra refresh runs (stale-while-
+    # revalidate), so a slow or failing feed never delays a handler.
+    # Quotes older than `max_age` are withheld rather than shown; `fallback`
+    # rates (the static EUR->USD rate) are used when no live quote exists.
+    def __init__(self, provider, ttl: float = 60, max_age: float = 900, fallback=None, timeout: float = 10):
+        self.provider = provider
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_age = max_age
+        self.fallback = parse_rates(fallback or {})
+        self._rates = {}
+        self._fetched_at = 0.0
+        self._refresh_task = None
+        self._loop_task = None
+        self._started = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.last_error = None
+    
+    async def start(self, application=None):
+        # Every store in the process starts and stops the shared cache; the
+        # loop runs until the last of them stops
+        self._started += 1
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._loop())
+    
+    async def stop(self, application=None):
+        self._started = max(0, self._started - 1)
+        if self._started:
+            return
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+    
+    async def _loop(self):
+        while True:
+            self._revalidate()
+            await asyncio.sleep(self.ttl)
+    
+    def _revalidate(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+    
+    async def refresh(self):
+        try:
+            rates = await asyncio.wait_for(self.provider.fetch(), self.timeout)
+        except Exception as e:
+            # Keep serving the previous rates until max_age runs out
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+            logger.warning(f"Rate refresh from {self.provider.name} provider failed: {self.last_error}")
+            return
+        self._rates = rates
+        self._fetched_at = time.monotonic()
+        self.refreshes += 1
+    
+    def age(self):
+        return time.monotonic() - self._fetched_at if self._fetched_at else None
+    
+    def quote(self, currency: str):
+        # Units of `currency` per 1 EUR, or None if no usable quote
+        currency = currency.lower()
+        age = self.age()
+        if age is None or age > self.ttl:
+            try:
+                self._revalidate()
+            except RuntimeError:
+                pass  # No running event loop
+        if age is not None and age <= self.max_age and currency in self._rates:
+            return self._rates[currency]
+        return self.fallback.get(currency)
+    
+    def convert(self, amount_eur: float, currency: str):
+        rate = self.quote(currency)
+        return None if rate is None else amount_eur * rate
+    
+    def format(self, amount_eur: float, currency: str):
+        # "0.00012345 BTC", or None without a quote
+        amount = self.convert(amount_eur, currency)
+        if amount is None:
+            return None
+        return f"{amount:.{CURRENCY_DECIMALS.get(currency.lower(), 8)}f} {currency.upper()}"
+    
+    def stats(self):
+        return {
+            'provider': self.provider.name,
+            'currencies': sorted(self._rates),
+            'age': self.age(),
+            'refreshes': self.refreshes,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
+
+def build_provider(config):
+    if config.RATE_PROVIDER == 'file':
+        return FileRateProvider(config.RATE_FILE)
+    if config.RATE_PROVIDER == 'http':
+        return HttpRateProvider(config.RATE_URL, config.RATE_TIMEOUT)
+    return StaticRateProvider({'usd': config.EXCHANGE_RATE})
+
+rate_cache = RateCache(build_provider(Config), Config.RATE_TTL, Config.RATE_MAX_AGE, {'usd': Config.EXCHANGE_RATE}, Config.RATE_TIMEOUT)
@@ -0,0 +1,74 @@
+import logging
+from collections import OrderedDict
+from telegram.error import BadRequest
+
+logger = logging.getLogger(__name__)
+
+class RenderCache:
+    # Remembers a fingerprint of what each (chat_id, message_id) currently
+    # shows, so an edit that would not change anything can be skipped.
+    # Least recently edited messages are forgotten past max_entries; a
+    # forgotten message simply gets edited again.
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._fingerprints = OrderedDict()
+        self.skipped = 0
+        self.edits = 0
+    
+    @staticmethod
+    def fingerprint(text, reply_markup=None, parse_mode=None):
+        # PTB markup objects hash by their buttons
+        return hash((text, reply_markup, parse_mode))
+    
+    def is_current(self, key, fingerprint):
+        if self._fingerprints.get(key) == fingerprint:
+            self._fingerprints.move_to_end(key)
+            return True
+        return False
+    
+    def remember(self, key, fingerprint):
+        self._fingerprints[key] = fingerprint
+        self._fingerprints.move_to_end(key)
+        if len(self._fingerprints) > self.max_entries:
+            self._fingerprints.popitem(last=False)
+    
+    def forget(self, key):
+        self._fingerprints.pop(key, None)
+    
+    def stats(self):
+        total = self.skipped + self.edits
+        return {
+            'entries': len(self._fingerprints),
+            'edits': self.edits,
+            'skipped': self.skipped,
+            'skip_rate': self.skipped / total if total else 0.0,
+        }
+    
+    async def edit_message(self, query, text, reply_markup=None, parse_mode=None):
+        # Drop-in for query.edit_message_text(). The callback query has already
+        # been answered by button_handler, so a skipped edit costs no API call.
+        # All callback screens must go through here, otherwise the cache could
+        # hold a stale fingerprint for a message edited elsewhere.
+        message = query.message
+        if message is None:
+            return await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        
+        key = (message.chat.id, message.message_id)
+        fingerprint = self.fingerprint(text, reply_markup, parse_mode)
+        if self.is_current(key, fingerprint):
+            self.skipped += 1
+            return None
+        
+        try:
+            result = await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        except BadRequest as e:
+            if 'message is not modified' in str(e).lower():
+                self.remember(key, fingerprint)
+                self.skipped += 1
+                return None
+            self.forget(key)
+            raise
+        
+        self.remember(key, fingerprint)
+        self.edits += 1
+        return result
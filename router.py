@@ -0,0 +1,81 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROUTES_ATTR = '_callback_routes'
+
+def callback(pattern: str, *arg_types):
+    # Marks a handler method for CallbackRouter.register(). Without argument
+    # types the pattern must equal the callback data exactly. With argument
+    # types it is a prefix: the rest of the callback data is split on "_"
+    # into len(arg_types) parts, each converted by its type and passed to
+    # the handler positionally. Decorators can be stacked.
+    def decorator(func):
+        func.__dict__.setdefault(ROUTES_ATTR, []).append((pattern, arg_types))
+        return func
+    return decorator
+
+class CallbackRouter:
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+
+    def add(self, pattern: str, handler, arg_types=()):
+        table = self.prefixes if arg_types else self.exact
+        if pattern in table:
+            raise ValueError(f"Duplicate callback route: {pattern}")
+        
+        if arg_types:
+            if not pattern.endswith('_'):
+                raise ValueError(f"Parameterized callback route must end with '_': {pattern}")
+            self.prefixes[pattern] = (handler, arg_types)
+        else:
+            self.exact[pattern] = handler
+
+    def register(self, handlers):
+        for name in dir(type(handlers)):
+            for pattern, arg_types in getattr(getattr(type(handlers), name), ROUTES_ATTR, ()):
+                self.add(pattern, getattr(handlers, name), arg_types)
+
+    def resolve(self, data: str):
+        # Exact routes are a single dict lookup. Prefixes all end in "_", so
+        # the only candidates are the data cut after each underscore; they
+        # are tried longest first (admin_confirm_yes_ beats admin_confirm_),
+        # one dict lookup per underscore.
+        handler = self.exact.get(data)
+        if handler is not None:
+            return handler, ()
+        
+        end = len(data)
+        while True:
+            end = data.rfind('_', 0, end)
+            if end < 0:
+                return None
+            route = self.prefixes.get(data[:end + 1])
+            if route is not None:
+                break
+        
+        handler, arg_types = route
+        rest = data[end + 1:]
+        try:
+            # Single-argument routes are the common case; skip split/zip
+            if len(arg_types) == 1:
+                return (handler, (arg_types[0](rest),)) if rest else None
+            
+            parts = rest.split('_', len(arg_types) - 1)
+            if len(parts) != len(arg_types) or '' in parts:
+                return None
+            return handler, tuple([convert(part) for convert, part in zip(arg_types, parts)])
+        except ValueError:
+            return None
+
+    async def dispatch(self, update, context):
+        data = update.callback_query.data
+        route = self.resolve(data)
+        if route is None:
+            logger.warning(f"No route for callback data: {data}")
+            return False
+        
+        handler, args = route
+        await handler(update, context, *args)
+        return True
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import pickle
+import random
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Users whose user_data is pickled to estimate the total size on the
+# statistics screen
+SIZE_SAMPLE = 200
+
+# Per-user checkout state kept in context.user_data between the buy/checkout
+# buttons and the payment source address message
+CHECKOUT_KEYS = ('current_order', 'checkout_total', 'checkout_items', 'payment_currency', 'payment_address', 'discount_code')
+SESSION_TIMESTAMP = 'checkout_at'
+
+def touch_checkout(user_data):
+    user_data[SESSION_TIMESTAMP] = time.time()
+
+def clear_checkout(user_data):
+    for key in CHECKOUT_KEYS:
+        user_data.pop(key, None)
+    user_data.pop(SESSION_TIMESTAMP, None)
+
+def peak_rss_kb():
+    # None where the resource module is missing (Windows); ru_maxrss is in
+    # bytes on macOS and KiB elsewhere
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+class SessionSweeper:
+    # Periodically evicts checkout state older than `ttl` seconds from every
+    # user's user_data, starting right after startup so checkouts reloaded
+    # from persistence do not outlive their ttl. Users left with no data at
+    # all are dropped from the application (and from persistence) entirely;
+    # the others are marked so the persisted copy loses the checkout too.
+    def __init__(self, ttl: float = 3600, interval: float = 300):
+        self.ttl = ttl
+        self.interval = interval
+        self.application = None
+        self._task = None
+        self.evicted = 0
+        self.dropped = 0
+        self.last_sweep = None
+    
+    async def start(self, application):
+        self.application = application
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self, application=None):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def sweep(self, now: float = None):
+        now = now or time.time()
+        cutoff = now - self.ttl
+        evicted = 0
+        changed = []
+        empty = []
+        
+        for user_id, user_data in list(self.application.user_data.items()):
+            started = user_data.get(SESSION_TIMESTAMP)
+            if started is None:
+                # Checkout state from before timestamps existed
+                if not any(key in user_data for key in CHECKOUT_KEYS):
+                    continue
+                user_data[SESSION_TIMESTAMP] = now
+            elif started < cutoff:
+                clear_checkout(user_data)
+                evicted += 1
+            else:
+                continue
+            if user_data:
+                changed.append(user_id)
+            else:
+                empty.append(user_id)
+        
+        # Edits made outside a handler only reach persistence when marked
+        self.application.mark_data_for_update_persistence(user_ids=changed)
+        for user_id in empty:
+            self.application.drop_user_data(user_id)
+        
+        self.evicted += evicted
+        self.dropped += len(empty)
+        self.last_sweep = now
+        if evicted or empty:
+            logger.info(f"Session sweep: evicted {evicted} checkouts, dropped {len(empty)} empty users")
+    
+    def stats(self):
+        # Serialized size of user_data, extrapolated from a random sample of
+        # users so the cost on the event loop does not grow with the store
+        user_data = self.application.user_data if self.application else {}
+        open_checkouts = sum(1 for data in user_data.values() if SESSION_TIMESTAMP in data)
+        size = 0
+        if user_data:
+            sample = random.sample(list(user_data.values()), min(SIZE_SAMPLE, len(user_data)))
+            sampled = sum(len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)) for data in sample)
+            size = sampled * len(user_data) // len(sample)
+        return {
+            'users': len(user_data),
+            'open_checkouts': open_checkouts,
+            'user_data_bytes': size,
+            'evicted': self.evicted,
+            'dropped': self.dropped,
+            'peak_rss_kb': peak_rss_kb(),
+        }
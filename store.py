@@ -0,0 +1,93 @@
+import logging
+
+from database import Database, POOL_SIZE
+from cache import ContentCache, CatalogCache, CacheSync
+from outbox import Outbox
+from render import RenderCache
+from sessions import SessionSweeper
+from maintenance import CartPurger
+from templates import TemplateRegistry, TEMPLATES, KEYBOARDS
+
+logger = logging.getLogger(__name__)
+
+# Every Store built in this process, in creation order; the statistics
+# screen lists them so an admin can see how tenants share the process
+stores = []
+
+class Store:
+    def __init__(self, config, name='default', executor=None, shard=None):
+        # shard is (index, count) when this store is one of several worker
+        # processes over the same database (see workers.py)
+        self.config = config
+        self.name = name
+        self.shard = shard
+        self.db = Database(config.DB_PATH, pool_size=POOL_SIZE, executor=executor)
+        self.content_cache = ContentCache(self.db)
+        self.content_cache.load()
+        self.catalog_cache = CatalogCache(self.db, config.PRODUCTS_PAGE_SIZE)
+        self.templates = TemplateRegistry(TEMPLATES, KEYBOARDS, lambda: self.content_cache.version)
+        self.render_cache = RenderCache(config.RENDER_CACHE_SIZE)
+        # Customer chats each belong to one worker, but every worker notifies
+        # the admin; spacing those sends `count` intervals apart keeps the
+        # admin chat at one message per interval across all of them
+        chat_intervals = {}
+        if shard is not None:
+            chat_intervals[config.ADMIN_ID] = config.OUTBOX_CHAT_INTERVAL * shard[1]
+        self.outbox = Outbox(
+            rate=config.OUTBOX_RATE,
+            chat_interval=config.OUTBOX_CHAT_INTERVAL,
+            max_retries=config.OUTBOX_MAX_RETRIES,
+            chat_intervals=chat_intervals,
+        )
+        self.session_sweeper = SessionSweeper(ttl=config.CHECKOUT_TTL, interval=config.SESSION_SWEEP_INTERVAL)
+        self.cart_purger = CartPurger(
+            self.db,
+            ttl=config.CART_TTL,
+            interval=config.CART_PURGE_INTERVAL,
+            batch_size=config.CART_PURGE_BATCH,
+        )
+        self.cache_sync = None
+        if shard is not None:
+            self.cache_sync = CacheSync(self.db, self.content_cache, self.catalog_cache, config.CACHE_SYNC_INTERVAL)
+        self.application = None
+        stores.append(self)
+
+    async def start(self, application):
+        self.application = application
+        await self.outbox.start(application)
+        await self.session_sweeper.start(application)
+        # The purge is database-wide, one worker running it is enough
+        if self.shard is None or self.shard[0] == 0:
+            await self.cart_purger.start(application)
+        if self.cache_sync is not None:
+            await self.cache_sync.start(application)
+        logger.info(f"Store '{self.name}' started ({self.config.DB_PATH})")
+
+    async def stop(self, application):
+        if self.cache_sync is not None:
+            await self.cache_sync.stop(application)
+        await self.cart_purger.stop(application)
+        await self.session_sweeper.stop(application)
+        await self.outbox.stop(application)
+
+    def close(self):
+        self.db.close()
+        if self in stores:
+            stores.remove(self)
+
+    def metrics(self):
+        processor = getattr(self.application, 'update_processor', None)
+        processed = processor.stats()['processed'] if hasattr(processor, 'stats') else 0
+        outbox_stats = self.outbox.stats()
+        db_stats = self.db.stats()
+        return {
+            'name': self.name,
+            'db_path': self.config.DB_PATH,
+            'running': self.application is not None and self.application.running,
+            'processed': processed,
+            'sent': outbox_stats['sent'],
+            'pending': outbox_stats['pending'],
+            'db_connections': db_stats['connections'],
+            'shared_executor': db_stats['shared_executor'],
+            'users': len(self.application.user_data) if self.application is not None else 0,
+        }
@@ -0,0 +1,158 @@
+import logging
+from string import Formatter
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_NAMES = {
+    'btc': 'Bitcoin',
+    'eth': 'Ethereum',
+    'sol': 'Solana',
+    'ltc': 'Litecoin',
+    'usdt': 'USDT',
+}
+
+CURRENCY_LABELS = {
+    'btc': '₿ Bitcoin',
+    'eth': 'Ξ Ethereum',
+    'sol': '◎ Solana',
+    'ltc': '💎 Litecoin',
+    'usdt': '💵 USDT',
+}
+
+def currency_name(code: str) -> str:
+    return CURRENCY_NAMES.get(code, code.upper())
+
+def currency_label(code: str) -> str:
+    return CURRENCY_LABELS.get(code, code.upper())
+
+# Message templates (str.format syntax). Row templates used with
+# render_rows() take positional fields in the order of the row tuples.
+TEMPLATES = {
+    'cart_empty': "🛒 Your cart is empty!",
+    'cart': "🛒 Your Cart:\n\n{items}💵 Total: {total:.2f}€ (${usd_total:.2f})",
+    'cart_item': "🛍️ {0}\n 💰 {1}€ × {2} = {3:.2f}€\n\n",
+    'payment_methods': "💳 Choose payment method:\n\n{product_text}\n💰 Total: {total:.2f}€ (${usd_total:.2f})",
+    'payment_methods_single': "🛍️ {name}\n💰 Price: {price}€",
+    'payment_methods_cart': "🛍️ Multiple products from cart",
+    'payment_details': """💳 **PAYMENT DETAILS**
+
+🛍️ {order_type}
+💰 Total: {total:.2f}€ (${usd_total:.2f})
+⛓️ Blockchain: {blockchain}
+
+📧 **SEND PAYMENT TO ADDRESS:**
+`{address}`
+
+⚠️ **IMPORTANT:**
+{send_line}
+• Copy address exactly
+
+After payment, click the button below:""",
+    'send_crypto_amount': "• Send exactly `{amount}` ({total:.2f}€)",
+    'send_eur_worth': "• Send exactly {total:.2f}€ worth of {currency}",
+    'payment_settings': "💳 Payment Settings:\n\n{methods}",
+    'payment_settings_item': "{0}:\n`{1}`\n\n",
+}
+
+# Keyboard layouts: functions returning rows of (text, callback_data)
+def _main_menu_keyboard():
+    return [
+        [("🛍️ Browse Products", "browse_products"), ("🛒 My Cart", "view_cart")],
+        [("ℹ️ About Us", "about"), ("📞 Contact", "contact")],
+        [("🌐 Website", "website"), ("📝 Rules", "rules")],
+        [("🔍 FAQ", "faq"), ("🔎 Search", "search_products")],
+    ]
+
+def _cart_keyboard(empty):
+    if empty:
+        return [[("🛍️ Continue Shopping", "browse_products"), ("🔙 Main Menu", "main_menu")]]
+    return [
+        [("💰 Checkout All", "checkout_all"), ("🗑️ Clear Cart", "clear_cart")],
+        [("🛍️ Continue Shopping", "continue_shopping"), ("🔙 Main Menu", "main_menu")],
+    ]
+
+def _payment_methods_keyboard(currency_codes):
+    rows = [[(currency_label(code), f"payment_{code}")] for code in currency_codes]
+    rows.append([("🔙 Back", "view_cart")])
+    return rows
+
+def _payment_details_keyboard():
+    return [[("✅ PAYMENT MADE", "payment_made"), ("🔙 Back to Payment Methods", "back_to_payment_methods")]]
+
+def _admin_panel_keyboard():
+    return [
+        [("📦 Product Management", "product_management")],
+        [("📝 Content Management", "content_management")],
+        [("💳 Payment Settings", "payment_settings")],
+        [("🎫 Discount Codes", "discount_codes")],
+        [("📊 Statistics", "statistics")],
+        [("📈 Sales Report", "sales_report")],
+        [("📤 Export Orders", "export_orders")],
+        [("🔙 Main Menu", "main_menu")],
+    ]
+
+def _payment_settings_keyboard(currency_codes):
+    rows = [
+        [(f"✏️ Edit {currency_label(code)}", f"edit_payment_{code}"), (f"🗑️ Remove {currency_label(code)}", f"remove_payment_{code}")]
+        for code in currency_codes
+    ]
+    rows.append([("➕ Add New Crypto", "add_new_crypto")])
+    rows.append([("🔙 Back to Admin Panel", "admin_panel")])
+    return rows
+
+KEYBOARDS = {
+    'main_menu': _main_menu_keyboard,
+    'cart': _cart_keyboard,
+    'payment_methods': _payment_methods_keyboard,
+    'payment_details': _payment_details_keyboard,
+    'admin_panel': _admin_panel_keyboard,
+    'payment_settings': _payment_settings_keyboard,
+}
+
+# Keyboards memoized per content version; cleared wholesale when exceeded
+MAX_CACHED_KEYBOARDS = 256
+
+class TemplateRegistry:
+    # Templates are parsed once at import (a malformed one fails startup,
+    # not a handler) and kept as bound str.format methods. Keyboards built
+    # by keyboard() are reused until the content version changes; PTB
+    # markup objects are immutable, so sharing them between users is safe.
+    def __init__(self, templates, keyboards, version_source):
+        formatter = Formatter()
+        self._formats = {}
+        for name, template in templates.items():
+            try:
+                list(formatter.parse(template))
+            except ValueError as e:
+                raise ValueError(f"Invalid template '{name}': {e}")
+            self._formats[name] = template.format
+        self._keyboard_builders = keyboards
+        self._version_source = version_source
+        self._keyboards = {}
+        self._keyboards_version = None
+    
+    def render(self, name, **values):
+        return self._formats[name](**values)
+    
+    def render_rows(self, name, rows, separator=''):
+        row_format = self._formats[name]
+        return separator.join([row_format(*row) for row in rows])
+    
+    def keyboard(self, name, *args):
+        # args are passed to the layout function and must be hashable, as
+        # they are part of the memo key
+        version = self._version_source()
+        if version != self._keyboards_version or len(self._keyboards) > MAX_CACHED_KEYBOARDS:
+            self._keyboards = {}
+            self._keyboards_version = version
+        
+        key = (name,) + args
+        markup = self._keyboards.get(key)
+        if markup is None:
+            markup = InlineKeyboardMarkup([
+                [InlineKeyboardButton(text, callback_data=data) for text, data in row]
+                for row in self._keyboard_builders[name](*args)
+            ])
+            self._keyboards[key] = markup
+        return markup
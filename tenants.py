@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from bot import StoreBot, webhook_settings
+
+logger = logging.getLogger(__name__)
+
+def load_tenants(path):
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty JSON list of tenants")
+
+    tenants = []
+    seen = {'name': set(), 'BOT_TOKEN': set(), 'DB_PATH': set(), 'webhook': set()}
+    for i, settings in enumerate(entries):
+        if not isinstance(settings, dict):
+            raise ValueError(f"Tenant #{i + 1} must be a JSON object")
+        name = str(settings.get('name') or f"tenant{i + 1}")
+        config = Config.for_tenant(settings)
+        if not config.BOT_TOKEN:
+            raise ValueError(f"Tenant '{name}' has no BOT_TOKEN")
+        if not config.ADMIN_ID:
+            raise ValueError(f"Tenant '{name}' has no ADMIN_ID")
+        if config.BOT_MODE == 'webhook' and not config.WEBHOOK_URL:
+            raise ValueError(f"Tenant '{name}' uses webhook mode without WEBHOOK_URL")
+
+        # Two tenants on one token would steal each other's updates, and on
+        # one database would mix catalogs, orders and sessions
+        keys = {'name': name, 'BOT_TOKEN': config.BOT_TOKEN, 'DB_PATH': config.DB_PATH}
+        if config.BOT_MODE == 'webhook':
+            keys['webhook'] = (config.WEBHOOK_LISTEN, config.WEBHOOK_PORT)
+        for key, value in keys.items():
+            if value in seen[key]:
+                label = 'webhook address' if key == 'webhook' else key
+                raise ValueError(f"Tenant '{name}' reuses {label} of another tenant")
+            seen[key].add(value)
+        tenants.append((name, config))
+    return tenants
+
+async def start_tenant(bot, application):
+    # Same sequence as Application.run_polling/run_webhook, minus the
+    # event loop and signal handling they would each want to own
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    if bot.config.BOT_MODE == 'webhook':
+        await application.updater.start_webhook(**webhook_settings(bot.config))
+    else:
+        await application.updater.start_polling()
+    await application.start()
+    logger.info(f"Tenant '{bot.name}' is running ({bot.config.BOT_MODE})")
+
+async def stop_tenant(bot, application):
+    try:
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        # post_init may have run even if the updater then failed to start
+        if bot.store.application is not None and application.post_stop:
+            await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        bot.store.close()
+
+async def serve_tenants(tenants, executor):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    running = []
+    try:
+        for name, config in tenants:
+            bot = StoreBot(config, name, executor=executor)
+            application = bot.build_application()
+            try:
+                await start_tenant(bot, application)
+            except Exception as e:
+                # One tenant with a revoked token or a busy port must not
+                # take the other storefronts down with it
+                logger.error(f"Tenant '{name}' failed to start: {e}")
+                await stop_tenant(bot, application)
+                continue
+            running.append((bot, application))
+
+        if not running:
+            raise RuntimeError("No tenant could be started")
+        logger.info(f"{len(running)} of {len(tenants)} tenants running")
+        await stop_event.wait()
+    finally:
+        # Each tenant finishes its in-flight updates and drains its outbox
+        for bot, application in reversed(running):
+            try:
+                await stop_tenant(bot, application)
+            except Exception as e:
+                logger.error(f"Error stopping tenant '{bot.name}': {e}")
+
+def run_tenants(path):
+    tenants = load_tenants(path)
+    executor = ThreadPoolExecutor(max_workers=Config.DB_THREADS, thread_name_prefix="db")
+    try:
+        asyncio.run(serve_tenants(tenants, executor))
+    finally:
+        executor.shutdown(wait=True)
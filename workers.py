@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+from telegram import Bot, Update
+from telegram.ext import Updater
+
+from config import Config
+from bot import StoreBot, webhook_settings
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Batches of updates waiting per worker before the supervisor blocks
+WORKER_QUEUE_SIZE = 1000
+# Updates taken from the webhook queue and handed over in one message
+ROUTE_BATCH_SIZE = 100
+# Seconds to wait for a worker to finish its updates on shutdown
+WORKER_STOP_TIMEOUT = 30
+
+def shard_of(update, count):
+    # Every update of one user goes to the same worker, in arrival order;
+    # PerUserUpdateProcessor keeps them ordered inside that worker.
+    # Private chats share the user's id, so their chat_data stays put too.
+    if update.effective_user is not None:
+        key = update.effective_user.id
+    elif update.effective_chat is not None:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % count
+
+def worker_main(index, count, updates, status, request_class=None):
+    # Ctrl-C and service stops reach the whole process group; the
+    # supervisor decides when workers stop and tells them via their queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(serve_worker(index, count, updates, status, request_class))
+
+async def serve_worker(index, count, updates, status, request_class=None):
+    config = Config()
+    # All workers send through the same bot token, so they split its rate
+    config.OUTBOX_RATE = Config.OUTBOX_RATE / count
+    bot = StoreBot(config, f"worker{index}", shard=(index, count))
+    application = bot.build_application(request_class() if request_class else None)
+
+    try:
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+    except Exception as e:
+        status.put(('failed', index, str(e)))
+        raise
+    status.put(('ready', index, None))
+    logger.info(f"Worker {index + 1}/{count} is running")
+
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    received = 0
+    try:
+        while True:
+            try:
+                batch = await loop.run_in_executor(None, updates.get, True, 1.0)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    logger.warning(f"Worker {index + 1}/{count}: supervisor is gone, stopping")
+                    break
+                continue
+            if batch is None:
+                break
+            for data in batch:
+                await application.update_queue.put(Update.de_json(data, application.bot))
+            received += len(batch)
+    finally:
+        # stop() returns once every update already queued has been handled
+        await application.stop()
+        processor_stats = application.update_processor.stats()
+        await application.post_stop(application)
+        await application.shutdown()
+        bot.store.close()
+        status.put(('stopped', index, {'received': received, **processor_stats}))
+
+class Supervisor:
+    # Receives updates in one process and spreads them over `count` worker
+    # processes by user. The workers share the SQLite database (WAL, busy
+    # timeout, atomic writes) and keep their caches in line via cache_versions.
+    def __init__(self, config, count, request_class=None):
+        self.config = config
+        self.count = count
+        self.request_class = request_class
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue(WORKER_QUEUE_SIZE) for _ in range(count)]
+        self.status = self._context.Queue()
+        self.processes = [None] * count
+        self.routed = [0] * count
+        self.restarts = 0
+        self.results = {}
+        self._stopping = False
+
+    def start_worker(self, index):
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, self.count, self.queues[index], self.status, self.request_class),
+            name=f"store-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+
+    async def _wait_status(self, kind, timeout):
+        loop = asyncio.get_running_loop()
+        pending = {index for index in range(self.count) if kind != 'stopped' or index not in self.results}
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event, index, data = await loop.run_in_executor(None, self.status.get, True, min(remaining, 1.0))
+            except queue.Empty:
+                # Nothing more to wait for from workers that already exited
+                if not any(self.processes[index] is not None and self.processes[index].is_alive() for index in pending):
+                    break
+                continue
+            if event == 'failed':
+                logger.error(f"Worker {index + 1}/{self.count} failed to start: {data}")
+                if kind == 'ready':
+                    break
+                continue
+            if event == 'stopped':
+                self.results[index] = data
+            if event == kind:
+                pending.discard(index)
+        return pending
+
+    async def start(self, timeout: float = 60):
+        # Migrations run once here instead of racing in every worker
+        Database(self.config.DB_PATH).close()
+        for index in range(self.count):
+            self.start_worker(index)
+        missing = await self._wait_status('ready', timeout)
+        if missing:
+            raise RuntimeError(f"Workers {sorted(missing)} did not start")
+        logger.info(f"{self.count} workers ready")
+
+    async def dispatch(self, updates):
+        batches = [[] for _ in range(self.count)]
+        for update in updates:
+            batches[shard_of(update, self.count)].append(update.to_dict())
+
+        loop = asyncio.get_running_loop()
+        for index, batch in enumerate(batches):
+            if not batch:
+                continue
+            try:
+                self.queues[index].put_nowait(batch)
+            except queue.Full:
+                # Backpressure: a slow worker holds up intake, not memory
+                await loop.run_in_executor(None, self.queues[index].put, batch)
+            self.routed[index] += len(batch)
+
+    async def route(self, update_queue):
+        while True:
+            updates = [await update_queue.get()]
+            while len(updates) < ROUTE_BATCH_SIZE and not update_queue.empty():
+                updates.append(update_queue.get_nowait())
+            try:
+                await self.dispatch(updates)
+            except Exception as e:
+                logger.error(f"Failed to route {len(updates)} updates: {e}")
+            finally:
+                for _ in updates:
+                    update_queue.task_done()
+
+    async def monitor(self, interval: float = 5):
+        # A crashed worker is restarted on the same queue, so its users
+        # keep their shard; only the updates it was handling are lost
+        while not self._stopping:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if not self._stopping and process is not None and not process.is_alive():
+                    logger.error(f"Worker {index + 1}/{self.count} exited with code {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self.start_worker(index)
+
+    async def stop(self, timeout: float = WORKER_STOP_TIMEOUT):
+        self._stopping = True
+        loop = asyncio.get_running_loop()
+        for update_queue in self.queues:
+            await loop.run_in_executor(None, update_queue.put, None)
+        missing = await self._wait_status('stopped', timeout)
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(1 if index in missing else timeout)
+            if process.is_alive():
+                logger.error(f"Worker {index + 1}/{self.count} did not stop in time, terminating")
+                process.terminate()
+                process.join()
+        logger.info(f"Workers stopped (routed per worker: {self.routed}, restarts: {self.restarts})")
+
+    def stats(self):
+        return {
+            'workers': self.count,
+            'alive': sum(1 for process in self.processes if process is not None and process.is_alive()),
+            'routed': list(self.routed),
+            'restarts': self.restarts,
+        }
+
+async def serve_workers(config, count):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    supervisor = Supervisor(config, count)
+    updater = Updater(Bot(config.BOT_TOKEN), asyncio.Queue())
+    tasks = []
+    try:
+        await supervisor.start()
+        await updater.initialize()
+        if config.BOT_MODE == 'webhook':
+            settings = webhook_settings(config)
+            logger.info(f"Supervisor is running (webhook on {settings['listen']}:{settings['port']}/{settings['url_path']}, {count} workers)...")
+            await updater.start_webhook(**settings)
+        else:
+            logger.info(f"Supervisor is running (polling, {count} workers)...")
+            await updater.start_polling()
+
+        tasks.append(asyncio.create_task(supervisor.route(updater.update_queue)))
+        tasks.append(asyncio.create_task(supervisor.monitor()))
+        await stop_event.wait()
+    finally:
+        # Stop taking updates, hand over the ones already received, then
+        # let every worker finish its queue and drain its outbox
+        if updater.running:
+            await updater.stop()
+        if tasks:
+            await updater.update_queue.join()
+        for task in tasks:
+            task.cancel()
+        await supervisor.stop()
+        await updater.shutdown()
+
+def run_workers(config, count):
+    asyncio.run(serve_workers(config, count))